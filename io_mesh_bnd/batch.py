@@ -0,0 +1,165 @@
+# ##### BEGIN LICENSE BLOCK #####
+#
+# This program is licensed under Creative Commons BY-NC-SA:
+# https://creativecommons.org/licenses/by-nc-sa/3.0/
+#
+# Created by Dummiesman, 2016-2020
+#
+# ##### END LICENSE BLOCK #####
+
+# Converts whole directories of bounds without Blender, one file per
+# worker process.
+#
+#   python -m io_mesh_bnd.batch bounds/ --to bbnd --jobs 8
+#   python -m io_mesh_bnd.batch bounds/ --to ter --out build/ter
+#   python -m io_mesh_bnd.batch bounds/ --to ter --ter-cell-size auto
+#   python -m io_mesh_bnd.batch bounds/ --to ter --ter-report ter.json
+
+import os, sys, json, time, argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import io_mesh_bnd.bound_io as bound_io
+
+# source extensions for each target, in order of preference when a bound
+# exists in both formats
+SOURCE_EXTENSIONS = {
+    "bbnd": (".bnd",),
+    "bnd": (".bbnd",),
+    "ter": (".bbnd", ".bnd"),
+}
+
+######################################################
+# CONVERT
+######################################################
+def write_bound(filepath, bound, target, ter_cell_size=bound_io.TER_CELL_SIZE):
+    """Returns the section quality report for TER, otherwise None"""
+    if target == "bnd":
+        with open(filepath, 'w') as file:
+            bound_io.write_bnd(file, bound)
+    elif target == "bbnd":
+        with open(filepath, 'wb') as file:
+            bound_io.write_bbnd(file, bound)
+    elif target == "ter":
+        if ter_cell_size == "auto":
+            ter_cell_size = bound_io.tune_ter_cell_size(bound)["cell_size"]
+        terrain = bound_io.make_terrain_bound(bound, cell_size=ter_cell_size)
+        with open(filepath, 'wb') as file:
+            bound_io.write_ter(file, terrain)
+        return bound_io.ter_quality(terrain)
+    else:
+        raise Exception('Unknown bound format: ' + target)
+    return None
+
+
+def convert_file(src_path, dst_path, target, ter_cell_size=bound_io.TER_CELL_SIZE):
+    """Worker entry point, returns the time taken and the TER quality
+    report"""
+    time1 = time.perf_counter()
+    bound = bound_io.read_bound_file(src_path)
+
+    dst_dir = os.path.dirname(dst_path)
+    if dst_dir:
+        os.makedirs(dst_dir, exist_ok=True)
+    quality = write_bound(dst_path, bound, target, ter_cell_size)
+    return time.perf_counter() - time1, quality
+
+
+def find_sources(src_dir, target):
+    """(source, relative output path) of every bound to convert, one per
+    bound name"""
+    extensions = SOURCE_EXTENSIONS[target]
+    sources = []
+    for root, dirs, files in os.walk(src_dir):
+        dirs.sort()
+        by_name = {}
+        for filename in files:
+            name, ext = os.path.splitext(filename)
+            ext = ext.lower()
+            if ext not in extensions:
+                continue
+            current = by_name.get(name)
+            if current is None or extensions.index(ext) < extensions.index(os.path.splitext(current)[1].lower()):
+                by_name[name] = filename
+
+        for name in sorted(by_name):
+            rel_dir = os.path.relpath(root, src_dir)
+            sources.append((os.path.join(root, by_name[name]), os.path.normpath(os.path.join(rel_dir, name + "." + target))))
+    return sources
+
+
+######################################################
+# MAIN
+######################################################
+def convert_directory(src_dir, target, out_dir=None, jobs=None, ter_cell_size=bound_io.TER_CELL_SIZE, report_path=None):
+    """Convert every bound under src_dir, output goes next to the source
+    unless out_dir is given. The TER quality report of every bound goes to
+    report_path as JSON. Returns a list of (source, error) failures."""
+    out_dir = src_dir if out_dir is None else out_dir
+    sources = find_sources(src_dir, target)
+    failures = []
+    reports = []
+
+    print("converting %d bounds to %s..." % (len(sources), target.upper()))
+    time1 = time.perf_counter()
+
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        futures = {executor.submit(convert_file, src_path, os.path.join(out_dir, rel_path), target, ter_cell_size): (src_path, rel_path)
+                   for src_path, rel_path in sources}
+
+        for num_done, future in enumerate(as_completed(futures), 1):
+            src_path, rel_path = futures[future]
+            try:
+                seconds, quality = future.result()
+                print(" [%d/%d] %s: %.4f sec." % (num_done, len(sources), src_path, seconds))
+            except Exception as e:
+                print(" [%d/%d] %s: FAILED, %s" % (num_done, len(sources), src_path, e))
+                failures.append((src_path, e))
+                continue
+
+            if quality is not None:
+                for warning in quality["warnings"]:
+                    print("   WARNING: " + warning)
+                reports.append(dict(quality, source=src_path, output=rel_path))
+
+    print(" done in %.4f sec., %d failed." % (time.perf_counter() - time1, len(failures)))
+
+    if report_path is not None:
+        reports.sort(key=lambda report: report["output"])
+        with open(report_path, 'w') as file:
+            json.dump({"bounds": reports, "flagged": [report["output"] for report in reports if len(report["warnings"]) > 0]}, file, indent=2)
+    return failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Batch convert BND/BBND bounds without Blender.")
+    parser.add_argument("directory", help="directory searched recursively for bounds")
+    parser.add_argument("--to", dest="target", required=True, choices=sorted(SOURCE_EXTENSIONS),
+                        help="format to convert to, TER is made from BBND or BND")
+    parser.add_argument("--out", default=None, help="output directory, defaults to next to each source")
+    parser.add_argument("--jobs", "-j", type=int, default=None, help="worker processes, defaults to the CPU count")
+    parser.add_argument("--ter-cell-size", default=str(bound_io.TER_CELL_SIZE),
+                        help="TER section size in metres, or 'auto' to pick one per bound")
+    parser.add_argument("--ter-report", default=None, help="write the section quality of every TER to this JSON file")
+    args = parser.parse_args(argv)
+
+    if args.jobs is not None and args.jobs < 1:
+        parser.error("--jobs must be 1 or more")
+
+    ter_cell_size = args.ter_cell_size
+    if ter_cell_size != "auto":
+        try:
+            ter_cell_size = float(ter_cell_size)
+        except ValueError:
+            parser.error("--ter-cell-size must be a number or 'auto'")
+        if ter_cell_size <= 0:
+            parser.error("--ter-cell-size must be more than 0")
+
+    if args.ter_report is not None and args.target != "ter":
+        parser.error("--ter-report needs --to ter")
+
+    failures = convert_directory(args.directory, args.target, args.out, args.jobs, ter_cell_size, args.ter_report)
+    return 1 if len(failures) > 0 else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
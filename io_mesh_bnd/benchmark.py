@@ -0,0 +1,276 @@
+# ##### BEGIN LICENSE BLOCK #####
+#
+# This program is licensed under Creative Commons BY-NC-SA:
+# https://creativecommons.org/licenses/by-nc-sa/3.0/
+#
+# Created by Dummiesman, 2016-2020
+#
+# ##### END LICENSE BLOCK #####
+
+# Times every import/export stage on synthetic bounds and writes the
+# results as JSON, so revisions can be compared. Runs without Blender,
+# mesh construction is only timed under blender --background.
+#
+#   python -m io_mesh_bnd.benchmark --sizes 1000 100000 --json new.json
+#   python -m io_mesh_bnd.benchmark --compare old.json new.json
+#   blender --background --python-expr "import sys, io_mesh_bnd.benchmark as b; sys.exit(b.main(['--sizes', '10000']))"
+
+import os, sys, math, time, json, platform, argparse, tempfile, tracemalloc, subprocess
+import numpy as np
+
+import io_mesh_bnd.bound_io as bound_io
+
+GENERATORS = ("grid", "city", "terrain")
+DEFAULT_SIZES = (1000, 10000, 100000, 1000000)
+
+# metres per grid cell, TER sections are 10m
+CELL_SIZE = 2.0
+
+######################################################
+# GENERATORS
+######################################################
+def grid_quads(nx, ny, cell, origin=(0.0, 0.0)):
+    """Vertex (x, y) and quad indices of an nx x ny grid of cells"""
+    xs = origin[0] + np.arange(nx + 1) * cell
+    ys = origin[1] + np.arange(ny + 1) * cell
+    co = np.stack((np.tile(xs, ny + 1), np.repeat(ys, nx + 1)), axis=1)
+    corner = (np.arange(ny)[:, None] * (nx + 1) + np.arange(nx)[None, :]).ravel()
+    quads = np.stack((corner, corner + 1, corner + nx + 2, corner + nx + 1), axis=1)
+    return co, quads
+
+
+def make_bound(vertices, quads, tris, num_materials=3, seed=1):
+    rng = np.random.default_rng(seed)
+    loop_vertices = np.concatenate((quads.ravel(), tris.ravel()))
+    face_sizes = np.concatenate((np.full(len(quads), 4), np.full(len(tris), 3)))
+    material_indices = rng.integers(0, num_materials, len(face_sizes))
+    material_names = ["grass", "cobblestone", "wood", "dirt", "sand"][:num_materials]
+    return bound_io.Bound(vertices.astype(np.float32), loop_vertices, face_sizes, material_indices, material_names)
+
+
+def make_grid(num_faces, seed=1):
+    """Jittered flat grid, every third cell split into two triangles"""
+    rng = np.random.default_rng(seed)
+    n = max(1, int(math.sqrt(num_faces * 3 / 4)))
+    co, quads = grid_quads(n, n, CELL_SIZE)
+
+    inner = (co[:, 0] > co[:, 0].min()) & (co[:, 0] < co[:, 0].max()) & (co[:, 1] > co[:, 1].min()) & (co[:, 1] < co[:, 1].max())
+    co[inner] += rng.uniform(-0.3, 0.3, (int(inner.sum()), 2)) * CELL_SIZE
+    vertices = np.column_stack((co, rng.uniform(0, 5, len(co))))
+
+    split = np.arange(len(quads)) % 3 == 0
+    tris = np.concatenate((quads[split][:, [0, 1, 2]], quads[split][:, [0, 2, 3]]))
+    return make_bound(vertices, quads[~split], tris, seed=seed)
+
+
+def make_city(num_faces, seed=1):
+    """Blocks of box buildings (a roof and four walls each) on a ground grid"""
+    rng = np.random.default_rng(seed)
+    num_buildings = max(1, (num_faces * 4 // 5) // 5)
+    lots = max(1, int(math.ceil(math.sqrt(num_buildings))))
+    lot_size = 4 * CELL_SIZE
+
+    # ground, one cell per lot
+    ground_co, ground_quads = grid_quads(lots, lots, lot_size)
+    ground = np.column_stack((ground_co, np.zeros(len(ground_co))))
+
+    # building footprints inset into their lot
+    lot_ids = np.arange(num_buildings)
+    lot_min = np.stack((lot_ids % lots, lot_ids // lots), axis=1) * lot_size
+    inset = rng.uniform(0.1, 0.3, (num_buildings, 2)) * lot_size
+    fmin = lot_min + inset
+    fmax = lot_min + lot_size - inset[:, ::-1]
+    height = rng.uniform(3, 40, num_buildings)
+
+    corners_x = np.stack((fmin[:, 0], fmax[:, 0], fmax[:, 0], fmin[:, 0]), axis=1)
+    corners_y = np.stack((fmin[:, 1], fmin[:, 1], fmax[:, 1], fmax[:, 1]), axis=1)
+    bottom = np.stack((corners_x, corners_y, np.zeros((num_buildings, 4))), axis=2)
+    top = np.stack((corners_x, corners_y, np.repeat(height[:, None], 4, axis=1)), axis=2)
+    building = np.concatenate((bottom, top), axis=1).reshape(-1, 3)
+
+    base = len(ground) + lot_ids[:, None] * 8
+    roof = base + np.array([4, 5, 6, 7])
+    walls = (base[:, :, None] + np.array([[0, 1, 5, 4], [1, 2, 6, 5], [2, 3, 7, 6], [3, 0, 4, 7]])).reshape(-1, 4)
+
+    vertices = np.concatenate((ground, building))
+    quads = np.concatenate((ground_quads, roof, walls))
+    return make_bound(vertices, quads, np.zeros((0, 3), dtype=np.int64), seed=seed)
+
+
+def make_terrain(num_faces, seed=1):
+    """Triangulated noisy height field"""
+    rng = np.random.default_rng(seed)
+    n = max(1, int(math.sqrt(num_faces / 2)))
+    co, quads = grid_quads(n, n, CELL_SIZE)
+
+    x = co[:, 0] / (n * CELL_SIZE)
+    y = co[:, 1] / (n * CELL_SIZE)
+    z = 20 * np.sin(x * 7) * np.cos(y * 5) + 6 * np.sin(x * 31 + y * 17) + rng.normal(0, 0.5, len(co))
+    vertices = np.column_stack((co, z))
+
+    tris = np.concatenate((quads[:, [0, 1, 2]], quads[:, [0, 2, 3]]))
+    return make_bound(vertices, np.zeros((0, 4), dtype=np.int64), tris, seed=seed)
+
+
+def make_synthetic(generator, num_faces, seed=1):
+    return {"grid": make_grid, "city": make_city, "terrain": make_terrain}[generator](num_faces, seed)
+
+
+######################################################
+# STAGES
+######################################################
+def stages(bound, directory):
+    """(name, callable) of every stage in order, later stages read the
+    files written by earlier ones"""
+    bnd_path = os.path.join(directory, "bench.bnd")
+    bbnd_path = os.path.join(directory, "bench.bbnd")
+    ter_path = os.path.join(directory, "bench.ter")
+    state = {}
+
+    def write_bnd():
+        with open(bnd_path, 'w') as file:
+            bound_io.write_bnd(file, bound)
+        return os.path.getsize(bnd_path)
+
+    def read_bnd():
+        with open(bnd_path, 'r') as file:
+            state["bound"] = bound_io.read_bnd(file)
+
+    def write_bbnd():
+        with open(bbnd_path, 'wb') as file:
+            bound_io.write_bbnd(file, bound)
+        return os.path.getsize(bbnd_path)
+
+    def read_bbnd():
+        state["bound"] = bound_io.read_bbnd(bbnd_path)
+
+    def assign_sections():
+        state["terrain"] = bound_io.make_terrain_bound(bound)
+
+    def write_ter():
+        with open(ter_path, 'wb') as file:
+            bound_io.write_ter(file, state["terrain"])
+        return os.path.getsize(ter_path)
+
+    def build_mesh():
+        import bpy
+        import io_mesh_bnd.common_helpers as helper
+        ob = helper.create_bound_object(bound)
+        me = ob.data
+        bpy.data.objects.remove(ob)
+        bpy.data.meshes.remove(me)
+
+    result = [("write_bnd", write_bnd), ("read_bnd", read_bnd), ("write_bbnd", write_bbnd), ("read_bbnd", read_bbnd),
+              ("assign_sections", assign_sections), ("write_ter", write_ter)]
+    if has_bpy():
+        result.append(("build_mesh", build_mesh))
+    return result
+
+
+def has_bpy():
+    try:
+        import bpy
+        return hasattr(bpy, "data")
+    except ImportError:
+        return False
+
+
+def time_stage(func, repeat, memory):
+    """Best wall time of repeat runs, and peak traced memory of a separate
+    run, traced runs are too slow to time"""
+    seconds = None
+    output_bytes = None
+    for _ in range(repeat):
+        time1 = time.perf_counter()
+        output_bytes = func()
+        elapsed = time.perf_counter() - time1
+        seconds = elapsed if seconds is None else min(seconds, elapsed)
+
+    peak = None
+    if memory:
+        tracemalloc.start()
+        try:
+            func()
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return seconds, peak, output_bytes
+
+
+######################################################
+# MAIN
+######################################################
+def revision():
+    try:
+        return subprocess.check_output(["git", "-C", os.path.dirname(os.path.abspath(__file__)), "rev-parse", "--short", "HEAD"],
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except Exception:
+        return None
+
+
+def run(generators=GENERATORS, sizes=DEFAULT_SIZES, repeat=3, memory=True, seed=1):
+    """Run every stage on every generator and size, returns the JSON
+    ready results"""
+    results = []
+    with tempfile.TemporaryDirectory(prefix="bnd_bench_") as directory:
+        for generator in generators:
+            for size in sizes:
+                bound = make_synthetic(generator, size, seed)
+                print("%s, %d faces, %d vertices" % (generator, bound.num_faces, bound.num_vertices))
+
+                for stage, func in stages(bound, directory):
+                    record = {"generator": generator, "size": size, "faces": bound.num_faces, "vertices": bound.num_vertices, "stage": stage}
+                    try:
+                        seconds, peak, output_bytes = time_stage(func, repeat, memory)
+                        record.update(seconds=seconds, peak_mib=None if peak is None else peak / (1024 * 1024), bytes=output_bytes)
+                        print(" %s: %.4f sec.%s" % (stage, seconds, "" if peak is None else ", peak %.2f MiB" % record["peak_mib"]))
+                    except Exception as e:
+                        # e.g. bounds too large for the 16 bit formats
+                        record.update(error=str(e))
+                        print(" %s: FAILED, %s" % (stage, e))
+                    results.append(record)
+
+    return {"revision": revision(), "python": platform.python_version(), "numpy": np.__version__,
+            "platform": platform.platform(), "repeat": repeat, "results": results}
+
+
+def compare(old_path, new_path):
+    """Print new / old time of every stage both files have"""
+    with open(old_path) as file:
+        old = {(r["generator"], r["size"], r["stage"]): r for r in json.load(file)["results"]}
+    with open(new_path) as file:
+        new = json.load(file)["results"]
+
+    print("%-8s %8s %-16s %10s %10s %7s" % ("bound", "faces", "stage", "old", "new", "ratio"))
+    for record in new:
+        previous = old.get((record["generator"], record["size"], record["stage"]))
+        if previous is None or "seconds" not in previous or "seconds" not in record:
+            continue
+        print("%-8s %8d %-16s %10.4f %10.4f %6.2fx" % (record["generator"], record["faces"], record["stage"], previous["seconds"], record["seconds"],
+                                                       record["seconds"] / max(previous["seconds"], 1e-9)))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark BND/BBND/TER import and export on synthetic bounds.")
+    parser.add_argument("--generators", nargs="+", default=list(GENERATORS), choices=GENERATORS)
+    parser.add_argument("--sizes", nargs="+", type=int, default=list(DEFAULT_SIZES), help="approximate face counts")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per stage, the best is kept")
+    parser.add_argument("--no-memory", dest="memory", action="store_false", help="skip the traced peak memory runs")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", default=None, help="write the results to this file")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="compare two result files and exit")
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        compare(*args.compare)
+        return 0
+
+    report = run(args.generators, args.sizes, max(1, args.repeat), args.memory, args.seed)
+    if args.json:
+        with open(args.json, 'w') as file:
+            json.dump(report, file, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
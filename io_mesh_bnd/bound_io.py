@@ -0,0 +1,902 @@
+# ##### BEGIN LICENSE BLOCK #####
+#
+# This program is licensed under Creative Commons BY-NC-SA:
+# https://creativecommons.org/licenses/by-nc-sa/3.0/
+#
+# Created by Dummiesman, 2016-2020
+#
+# ##### END LICENSE BLOCK #####
+
+# Bound file readers and writers with no bpy dependency, shared by the
+# Blender operators and headless tools.
+
+import os, mmap, math, struct, threading
+import numpy as np
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+import io_mesh_bnd.instrumentation as instrumentation
+from io_mesh_bnd.ter_section import TerGrid, hash_faces
+
+BBND_HEADER = struct.Struct('<B3L')
+BBND_MATERIAL_SIZE = 104
+BBND_VERTEX_DTYPE = np.dtype('<f4')
+BBND_FACE_DTYPE = np.dtype('<u2')
+
+
+def swap_space(vertices):
+    """Convert (verts, 3) positions between bound space and Blender space,
+    the conversion is its own inverse"""
+    return np.stack((vertices[:, 0] * -1, vertices[:, 2], vertices[:, 1]), axis=1)
+
+
+######################################################
+# BOUND DATA
+######################################################
+@dataclass
+class Bound:
+    """A bound as flat arrays. vertices is (verts, 3) in Blender space, face
+    i owns loop_vertices[face_starts[i]:face_starts[i] + face_sizes[i]].
+    loop_edge_vertices is the (loops, 2) edge each loop starts, if it came
+    from a mesh, otherwise the edges follow the face loops."""
+    vertices: np.ndarray
+    loop_vertices: np.ndarray
+    face_sizes: np.ndarray
+    material_indices: np.ndarray
+    material_names: List[str] = field(default_factory=list)
+    face_starts: Optional[np.ndarray] = None
+    loop_edge_vertices: Optional[np.ndarray] = None
+
+    def __post_init__(self):
+        self.vertices = np.asarray(self.vertices).reshape(-1, 3)
+        self.loop_vertices = np.asarray(self.loop_vertices, dtype=np.int32)
+        self.face_sizes = np.asarray(self.face_sizes, dtype=np.int32)
+        self.material_indices = np.asarray(self.material_indices, dtype=np.int32)
+        if self.face_starts is None:
+            self.face_starts = (np.cumsum(self.face_sizes, dtype=np.int32) - self.face_sizes).astype(np.int32)
+
+    @property
+    def num_vertices(self):
+        return len(self.vertices)
+
+    @property
+    def num_faces(self):
+        return len(self.face_sizes)
+
+    @property
+    def num_materials(self):
+        return max(len(self.material_names), 1)
+
+    def extents(self):
+        """(min, max) corners of the vertices, zero for an empty bound"""
+        if self.num_vertices == 0:
+            return np.zeros(3), np.zeros(3)
+        return self.vertices.min(axis=0).astype(np.float64), self.vertices.max(axis=0).astype(np.float64)
+
+    def loop_co(self):
+        """2D position of every loop, (loops, 2) float64"""
+        return self.vertices[self.loop_vertices, :2].astype(np.float64)
+
+    def edge_co(self):
+        """2D endpoints of the edge each loop starts, (loops, 4) float64"""
+        edge_vertices = self.loop_edge_vertices
+        if edge_vertices is None:
+            loop_ids = np.arange(len(self.loop_vertices))
+            face_ids = np.repeat(np.arange(self.num_faces), self.face_sizes)
+            next_loops = loop_ids + 1
+            wrap = next_loops == (self.face_starts + self.face_sizes)[face_ids]
+            next_loops[wrap] = self.face_starts[face_ids[wrap]]
+            edge_vertices = np.stack((self.loop_vertices, self.loop_vertices[next_loops]), axis=1)
+        return self.vertices[edge_vertices, :2].astype(np.float64).reshape(-1, 4)
+
+
+@dataclass
+class TerrainBound:
+    """TER section grid over a bound. Section i references the faces
+    section_faces[section_starts[i]:section_starts[i] + section_sizes[i]],
+    sections are in file order (depth major, width reversed)."""
+    num_faces: int
+    bnds_min: np.ndarray
+    bnds_max: np.ndarray
+    width_sections: int
+    height_sections: int
+    depth_sections: int
+    section_sizes: np.ndarray
+    section_faces: np.ndarray
+
+    @property
+    def num_sections(self):
+        return self.width_sections * self.height_sections * self.depth_sections
+
+    @property
+    def section_starts(self):
+        return np.cumsum(self.section_sizes) - self.section_sizes
+
+
+######################################################
+# BBND
+######################################################
+def make_char_array(w_str, length):
+    return bytes(w_str, 'utf-8') + bytes('\x00' * (length - len(w_str )), 'utf-8')
+
+
+def decode_material_name(name_bytes):
+    # remove non nulled junk
+    name_bytes = bytearray(name_bytes)
+    for b in range(len(name_bytes)):
+      if name_bytes[b] > 126:
+        name_bytes[b] = 0
+    return name_bytes.decode("utf-8").rstrip('\x00')
+
+
+class BinaryBoundFile:
+    """A memory mapped BBND file. vertices is a (verts, 3) float32 view in
+    bound space, faces is a (faces, 5) uint16 view of index0..3 and the
+    material index. The views are only valid until close()."""
+
+    def __init__(self, filepath):
+        self.mapping = None
+        with open(filepath, 'rb') as file:
+            if os.fstat(file.fileno()).st_size == 0:
+                raise Exception('BBND file is truncated.')
+            self.mapping = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        try:
+            self._read()
+        except Exception:
+            self.close()
+            raise
+
+    def _read(self):
+        buffer = self.mapping
+        if len(buffer) < BBND_HEADER.size:
+            raise Exception('BBND file is truncated.')
+
+        bbnd_version, num_verts, num_materials, num_faces = BBND_HEADER.unpack_from(buffer, 0)
+        if bbnd_version != 1:
+            raise Exception('BBND file is wrong version.')
+
+        vertex_offset = BBND_HEADER.size
+        material_offset = vertex_offset + (num_verts * 12)
+        face_offset = material_offset + (num_materials * BBND_MATERIAL_SIZE)
+        if len(buffer) < face_offset + (num_faces * 10):
+            raise Exception('BBND file is truncated.')
+
+        self.vertices = np.frombuffer(buffer, BBND_VERTEX_DTYPE, num_verts * 3, vertex_offset).reshape(num_verts, 3)
+        self.faces = np.frombuffer(buffer, BBND_FACE_DTYPE, num_faces * 5, face_offset).reshape(num_faces, 5)
+
+        # name is the first 32 chars, skip the rest of the material data
+        self.material_names = []
+        for i in range(num_materials):
+            name_offset = material_offset + (i * BBND_MATERIAL_SIZE)
+            self.material_names.append(decode_material_name(buffer[name_offset:name_offset + 32]))
+
+    def face_loops(self):
+        """Flat loop vertex indices and face sizes, a face with index3 == 0
+        is a triangle"""
+        is_quad = self.faces[:, 3] != 0
+        face_sizes = np.where(is_quad, 4, 3).astype(np.int32)
+        loop_mask = np.ones((len(self.faces), 4), dtype=bool)
+        loop_mask[:, 3] = is_quad
+        return self.faces[:, :4][loop_mask].astype(np.int32), face_sizes
+
+    def close(self):
+        # views must go before the mapping can be closed
+        self.vertices = None
+        self.faces = None
+        if self.mapping is not None:
+            self.mapping.close()
+            self.mapping = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def read_bbnd(filepath):
+    with BinaryBoundFile(filepath) as bbnd:
+        loop_vertices, face_sizes = bbnd.face_loops()
+        return Bound(swap_space(bbnd.vertices), loop_vertices, face_sizes,
+                     bbnd.faces[:, 4].astype(np.int32), bbnd.material_names)
+
+
+def make_binary_material(name):
+    return make_char_array(name, 32) + struct.pack('<ff', 0.1, 0.5) + make_char_array('none', 32) + make_char_array('none', 32)
+
+
+def make_binary_faces(bound):
+    # triangles and quads only, other polygons aren't written
+    face_sizes = bound.face_sizes
+    face_ids = np.flatnonzero((face_sizes == 3) | (face_sizes == 4))
+    face_starts = bound.face_starts[face_ids]
+    is_quad = face_sizes[face_ids] == 4
+
+    records = np.zeros((len(face_ids), 5), dtype=np.int64)
+    records[:, :3] = bound.loop_vertices[face_starts[:, None] + np.arange(3)]
+    records[is_quad, 3] = bound.loop_vertices[face_starts[is_quad] + 3]
+
+    # last index can't be 0 in a quad, so shift this polygon around if that's the case
+    shift = is_quad & (records[:, 3] == 0)
+    records[shift, :4] = records[shift][:, [3, 0, 1, 2]]
+
+    records[:, 4] = np.maximum(bound.material_indices[face_ids], 0)
+
+    if len(records) > 0 and records.max() > 0xFFFF:
+      raise Exception('BOUND is too large for BBND, vertex and material indices must be 65535 or less.')
+
+    return records.astype(BBND_FACE_DTYPE)
+
+
+def write_bbnd(file, bound):
+    report = instrumentation.current()
+    with report.stage("faces"):
+        faces = make_binary_faces(bound)
+
+    # header
+    file.write(BBND_HEADER.pack(1, bound.num_vertices, bound.num_materials, bound.num_faces))
+
+    # vertices
+    with report.stage("vertices"):
+        file.write(swap_space(bound.vertices).astype(BBND_VERTEX_DTYPE).tobytes())
+
+    # materials
+    if len(bound.material_names) > 0:
+        file.write(b''.join(make_binary_material(material_name) for material_name in bound.material_names))
+    else:
+        file.write(make_binary_material("default"))
+
+    # faces
+    with report.stage("write_faces"):
+        file.write(faces.tobytes())
+
+
+######################################################
+# BND
+######################################################
+BND_CHUNK_SIZE = 1 << 20
+
+# vertices/faces formatted per write
+BND_WRITE_CHUNK_SIZE = 4096
+
+
+class BlockArray:
+    """Array preallocated from a declared count and filled a block at a
+    time, grows if the file under reports its counts"""
+
+    def __init__(self, dtype, row_shape=()):
+        self.data = np.empty((0,) + row_shape, dtype=dtype)
+        self.size = 0
+
+    def reserve(self, count):
+        if count <= len(self.data):
+            return
+        grown = np.empty((max(count, len(self.data) * 2),) + self.data.shape[1:], dtype=self.data.dtype)
+        grown[:self.size] = self.data[:self.size]
+        self.data = grown
+
+    def extend(self, block):
+        self.reserve(self.size + len(block))
+        self.data[self.size:self.size + len(block)] = block
+        self.size += len(block)
+
+    def array(self):
+        return self.data[:self.size]
+
+
+def tokenize_bnd_line(line):
+    # get line components
+    cmps = line.split()
+
+    # empty line?
+    if len(cmps) < 2:
+        return
+
+    if cmps[0] == "v":
+        yield "v", [(float(cmps[1]), float(cmps[2]), float(cmps[3]))]
+    elif cmps[0] == "quad" or cmps[0] == "tri":
+        num_indices = 4 if cmps[0] == "quad" else 3
+        yield "faces", ([int(cmps[i + 1]) for i in range(num_indices)], [num_indices], [int(cmps[num_indices + 1])])
+    else:
+        yield cmps[0], cmps[1:]
+
+
+def parse_bnd_vertices(lines):
+    """Parse a run of 'v' lines into a list of (verts, 3) bound space blocks"""
+    tokens = " ".join(lines).split()
+    if len(tokens) == len(lines) * 4 and tokens[::4].count("v") == len(lines):
+        del tokens[::4]
+        try:
+            return [np.array(tokens, dtype=np.float64).reshape(-1, 3)]
+        except ValueError:
+            pass
+
+    # some lines have extra or malformed components, go line by line
+    return [value for line in lines for keyword, value in tokenize_bnd_line(line) if keyword == "v"]
+
+
+def parse_bnd_faces(lines, is_quad):
+    """Parse a run of 'tri'/'quad' lines into a list of (loop vertices,
+    face sizes, material indices) blocks"""
+    face_sizes = np.where(is_quad, 4, 3)
+    record_sizes = face_sizes + 2
+    record_starts = np.cumsum(record_sizes) - record_sizes
+
+    # keywords become sentinels so the layout of every line can be checked
+    text = " ".join(lines).replace("quad", "-2").replace("tri", "-1")
+    try:
+        numbers = np.array(text.split(), dtype=np.int64)
+    except ValueError:
+        numbers = None
+
+    if numbers is not None and len(numbers) == int(record_sizes.sum()) and \
+       np.array_equal(numbers[record_starts], np.where(is_quad, -2, -1)):
+        is_loop = np.ones(len(numbers), dtype=bool)
+        is_loop[record_starts] = False
+        is_loop[record_starts + record_sizes - 1] = False
+        return [(numbers[is_loop], face_sizes, numbers[record_starts + record_sizes - 1])]
+
+    # some lines have extra or malformed components, go line by line
+    return [value for line in lines for keyword, value in tokenize_bnd_line(line) if keyword == "faces"]
+
+
+# line kinds found by the first two characters
+BND_LINE_KINDS = {"v ": 1, "v\t": 1, "tr": 2, "qu": 3}
+
+
+def tokenize_bnd_runs(lines):
+    # find runs of vertex and face lines
+    kinds = np.array([BND_LINE_KINDS.get(line[:2], 0) for line in lines], dtype=np.int8)
+    run_kinds = np.minimum(kinds, 2)
+    run_starts = np.concatenate(([0], np.flatnonzero(run_kinds[1:] != run_kinds[:-1]) + 1))
+    run_ends = np.append(run_starts[1:], len(lines))
+
+    for start, end in zip(run_starts.tolist(), run_ends.tolist()):
+        if run_kinds[start] == 1:
+            for block in parse_bnd_vertices(lines[start:end]):
+                yield "v", block
+        elif run_kinds[start] == 2:
+            for block in parse_bnd_faces(lines[start:end], kinds[start:end] == 3):
+                yield "faces", block
+        else:
+            for line in lines[start:end]:
+                yield from tokenize_bnd_line(line)
+
+
+def tokenize_bnd(file):
+    """Yields (keyword, value) from a BND file a chunk at a time. Runs of
+    'v' and 'tri'/'quad' lines are parsed in bulk into "v" and "faces"
+    blocks, other lines yield their first component and the rest. Material
+    property blocks are skipped."""
+    depth = 0
+    for chunk in iter(lambda: file.readlines(BND_CHUNK_SIZE), []):
+        text = "".join(chunk).lower()
+        lines = text.split("\n")
+
+        braces = [pos for pos in (text.find('{'), text.find('}')) if pos != -1]
+        if depth == 0 and len(braces) == 0:
+            yield from tokenize_bnd_runs(lines)
+            continue
+
+        # lines between the first and last brace go one at a time
+        first = text.count("\n", 0, min(braces)) if depth == 0 and len(braces) > 0 else 0
+        last = text.count("\n", 0, max(text.rfind('{'), text.rfind('}'))) + 1
+
+        if first > 0:
+            yield from tokenize_bnd_runs(lines[:first])
+
+        for line in lines[first:last]:
+            if depth == 0:
+                yield from tokenize_bnd_line(line)
+            if '{' in line or '}' in line:
+                depth = max(0, depth + line.count('{') - line.count('}'))
+
+        # the rest is either inside a block or has none
+        if depth == 0 and last < len(lines):
+            yield from tokenize_bnd_runs(lines[last:])
+
+
+def read_bnd(file):
+    """Read an ASCII bound from an open text file"""
+    vertices = BlockArray(np.float64, (3,))
+    loop_vertices = BlockArray(np.int32)
+    face_sizes = BlockArray(np.int32)
+    material_indices = BlockArray(np.int32)
+    material_names = []
+
+    for keyword, value in tokenize_bnd(file):
+        if keyword == "v":
+            # vertex
+            vertices.extend(value)
+        elif keyword == "faces":
+            block_loops, block_sizes, block_materials = value
+            loop_vertices.extend(block_loops)
+            face_sizes.extend(block_sizes)
+            material_indices.extend(block_materials)
+        elif keyword == "mtl":
+            # material
+            material_names.append(value[0])
+        elif keyword == "verts:":
+            vertices.reserve(int(value[0]))
+        elif keyword == "polys:":
+            num_polys = int(value[0])
+            face_sizes.reserve(num_polys)
+            material_indices.reserve(num_polys)
+            loop_vertices.reserve(num_polys * 4)
+
+    return Bound(swap_space(vertices.array()), loop_vertices.array(), face_sizes.array(), material_indices.array(), material_names)
+
+
+def make_ascii_material(name):
+    return "mtl " + name + " {\n\telasticity: 0.100000\n\tfriction: 0.500000\n\teffect: none\n\tsound: none\n}\n"
+
+
+def write_bnd(file, bound):
+    report = instrumentation.current()
+
+    # header
+    file.write("version: 1.01\nverts: " + str(bound.num_vertices) + "\nmaterials: " + str(bound.num_materials) + "\nedges: 0\npolys: " + str(bound.num_faces) + "\n\n")
+
+    # vertices
+    with report.stage("vertices"):
+      for chunk_start in range(0, bound.num_vertices, BND_WRITE_CHUNK_SIZE):
+        chunk = swap_space(bound.vertices[chunk_start:chunk_start + BND_WRITE_CHUNK_SIZE])
+        file.write(("v %.6f %.6f %.6f\n" * len(chunk)) % tuple(chunk.ravel().tolist()))
+
+    file.write("\n")
+
+    # materials
+    if len(bound.material_names) > 0:
+        file.write("".join(make_ascii_material(material_name) for material_name in bound.material_names))
+    else:
+        file.write(make_ascii_material("default"))
+
+    file.write("\n")
+
+    # faces, triangles and quads only
+    with report.stage("faces"):
+      face_sizes = bound.face_sizes
+      for chunk_start in range(0, bound.num_faces, BND_WRITE_CHUNK_SIZE):
+        chunk_sizes = face_sizes[chunk_start:chunk_start + BND_WRITE_CHUNK_SIZE]
+        chunk = chunk_start + np.flatnonzero((chunk_sizes == 3) | (chunk_sizes == 4))
+        face_starts = bound.face_starts[chunk]
+        is_quad = face_sizes[chunk] == 4
+
+        records = np.zeros((len(chunk), 5), dtype=np.int64)
+        records[:, :3] = bound.loop_vertices[face_starts[:, None] + np.arange(3)]
+        records[is_quad, 3] = bound.loop_vertices[face_starts[is_quad] + 3]
+        records[:, 4] = np.maximum(bound.material_indices[chunk], 0)
+
+        # triangles have no fourth index
+        record_mask = np.ones(records.shape, dtype=bool)
+        record_mask[:, 3] = is_quad
+
+        line_format = "".join(np.where(is_quad, "quad %d  %d  %d  %d  %d\n", "tri %d  %d  %d  %d\n").tolist())
+        file.write(line_format % tuple(records[record_mask].tolist()))
+
+
+######################################################
+# FILES
+######################################################
+def read_bound_file(filepath):
+    """Read a BND or BBND by extension"""
+    if filepath.lower().endswith(".bbnd"):
+        return read_bbnd(filepath)
+    with open(filepath, 'r') as file:
+        return read_bnd(file)
+
+
+class BoundCache:
+    """Process wide cache of parsed bounds, keyed by path, mtime and size.
+    Cached arrays are read only and shared by every Bound returned for the
+    same file. Least recently used bounds go once the arrays take more than
+    max_bytes."""
+
+    def __init__(self, max_bytes=256 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def bound_bytes(bound):
+        return sum(array.nbytes for array in (bound.vertices, bound.loop_vertices, bound.face_starts, bound.face_sizes, bound.material_indices))
+
+    def read(self, filepath):
+        filepath = os.path.abspath(filepath)
+        stat = os.stat(filepath)
+        key = (filepath, stat.st_mtime_ns, stat.st_size)
+
+        with self.lock:
+            bound = self.entries.get(key)
+            if bound is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+            else:
+                self.misses += 1
+
+        if bound is None:
+            bound = read_bound_file(filepath)
+            for array in (bound.vertices, bound.loop_vertices, bound.face_starts, bound.face_sizes, bound.material_indices):
+                array.flags.writeable = False
+            self.add(key, bound)
+
+        return Bound(bound.vertices, bound.loop_vertices, bound.face_sizes, bound.material_indices,
+                     list(bound.material_names), bound.face_starts)
+
+    def add(self, key, bound):
+        size = self.bound_bytes(bound)
+        with self.lock:
+            if size > self.max_bytes:
+                return
+
+            # older versions of the file can't be hit again
+            for old_key in [k for k in self.entries if k[0] == key[0]]:
+                self.total_bytes -= self.bound_bytes(self.entries.pop(old_key))
+
+            self.entries[key] = bound
+            self.total_bytes += size
+            while self.total_bytes > self.max_bytes:
+                _, evicted = self.entries.popitem(last=False)
+                self.total_bytes -= self.bound_bytes(evicted)
+
+    def stats(self):
+        with self.lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self.entries),
+                    "bytes": self.total_bytes, "max_bytes": self.max_bytes}
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.total_bytes = 0
+
+
+# shared by the importers
+bound_cache = BoundCache()
+
+
+######################################################
+# TER
+######################################################
+# bump when the sidecar layout changes
+TER_CACHE_VERSION = 1
+
+# section size in metres, the TER header stores its inverse so any size
+# works in game
+TER_CELL_SIZE = 10
+
+# section sizes tried by tune_ter_cell_size
+TER_CELL_SIZES = (2.5, 5, 7.5, 10, 15, 20, 30, 40, 60)
+
+# cost of a uint16 table word per face, against a face tested per lookup
+TER_TABLE_WEIGHT = 0.5
+
+# past these a bound gets a warning in its quality report, the tuner
+# skips section sizes over the duplicate ratio
+TER_WARN_SECTION_FACES = 128
+TER_WARN_QUERY_FACES = 64
+TER_WARN_DUPLICATE_RATIO = 4.0
+
+
+def make_ter_grid(bnds_min, bnds_max, cell_size=TER_CELL_SIZE):
+    """The section grid covering bnds_min..bnds_max (Blender space), with
+    sections of about cell_size metres"""
+    bnd_width = math.fabs(bnds_max[0] - bnds_min[0])
+    bnd_depth = math.fabs(bnds_max[1] - bnds_min[1])
+
+    # section data
+    width_sections = max(1, math.ceil(bnd_width / cell_size))
+    depth_sections = max(1, math.ceil(bnd_depth / cell_size))
+
+    individual_section_width = (1 / width_sections) * bnd_width
+    individual_section_depth = (1 / depth_sections) * bnd_depth
+
+    return TerGrid((bnds_min[0], bnds_min[1]), width_sections, depth_sections, individual_section_width, individual_section_depth)
+
+
+def terrain_extents(bound, bnds_min, bnds_max):
+    if bnds_min is None or bnds_max is None:
+        bnds_min, bnds_max = bound.extents()
+    return np.asarray(bnds_min, dtype=np.float64), np.asarray(bnds_max, dtype=np.float64)
+
+
+def estimate_ter_grid(face_min, face_max, num_faces, bnds_min, bnds_max, cell_size):
+    """Table size and lookup cost of a grid, from face bounds alone (see
+    TerGrid.overlap_sizes) so they're upper bounds"""
+    ter_grid = make_ter_grid(bnds_min, bnds_max, cell_size)
+    section_sizes = ter_grid.overlap_sizes(face_min, face_max)
+    poly_indices = int(section_sizes.sum())
+
+    # faces tested by a query landing on a random face of the bound, so
+    # crowded sections count for more than empty ones
+    faces_per_lookup = float((section_sizes.astype(np.float64) ** 2).sum() / max(poly_indices, 1))
+    table_words = (2 * ter_grid.num_sections) + poly_indices
+
+    return {"cell_size": cell_size, "width_sections": ter_grid.width_sections, "depth_sections": ter_grid.depth_sections,
+            "sections": ter_grid.num_sections, "empty_sections": int((section_sizes == 0).sum()),
+            "poly_indices": poly_indices, "max_section": int(section_sizes.max()),
+            "duplicate_ratio": poly_indices / max(num_faces, 1),
+            "faces_per_lookup": faces_per_lookup,
+            "score": faces_per_lookup + (TER_TABLE_WEIGHT * table_words / max(num_faces, 1)),
+            "fits": poly_indices <= TER_INDEX_LIMIT}
+
+
+def tune_ter_cell_size(bound, bnds_min=None, bnds_max=None, cell_sizes=TER_CELL_SIZES):
+    """Pick the section size giving the fewest faces per lookup for the
+    table space, among cell_sizes whose tables fit in 16 bits and that
+    don't list faces in more than TER_WARN_DUPLICATE_RATIO sections on
+    average. Returns the estimate of the chosen size, see
+    estimate_ter_grid, with every estimate under "candidates"."""
+    bnds_min, bnds_max = terrain_extents(bound, bnds_min, bnds_max)
+    loop_co = bound.loop_co()
+    face_min, face_max = TerGrid.face_bounds(loop_co, bound.face_starts, np.asarray(bound.face_sizes, dtype=np.int64))
+
+    estimates = [estimate_ter_grid(face_min, face_max, bound.num_faces, bnds_min, bnds_max, cell_size) for cell_size in cell_sizes]
+
+    # the estimate is an upper bound, so a size passing here won't get the
+    # duplicate warning from ter_quality. When nothing fits, the smallest
+    # tables at least have a chance
+    fitting = [estimate for estimate in estimates if estimate["fits"]]
+    compact = [estimate for estimate in fitting if estimate["duplicate_ratio"] <= TER_WARN_DUPLICATE_RATIO]
+    if len(compact) > 0:
+        best = min(compact, key=lambda estimate: estimate["score"])
+    elif len(fitting) > 0:
+        best = min(fitting, key=lambda estimate: estimate["score"])
+    else:
+        best = min(estimates, key=lambda estimate: estimate["poly_indices"])
+    return dict(best, candidates=estimates)
+
+
+def make_terrain_bound(bound, bnds_min=None, bnds_max=None, progress=None, cell_size=TER_CELL_SIZE):
+    """Sort the faces of a bound into TER sections of about cell_size
+    metres. The grid covers bnds_min..bnds_max (Blender space), the vertex
+    extents by default. progress is called with the fraction of the pass
+    done, see TerGrid.assign."""
+    report = instrumentation.current()
+    bnds_min, bnds_max = terrain_extents(bound, bnds_min, bnds_max)
+    with report.stage("section_grid"):
+        ter_grid = make_ter_grid(bnds_min, bnds_max, cell_size)
+    report.count("sections", ter_grid.num_sections)
+
+    # calculate intersecting polygons
+    with report.stage("intersect"):
+        ter_grid.assign(bound.loop_co(), bound.edge_co(), bound.face_starts, bound.face_sizes, progress)
+
+    return TerrainBound(bound.num_faces, bnds_min, bnds_max, ter_grid.width_sections, 1, ter_grid.depth_sections,
+                        ter_grid.section_sizes, ter_grid.section_faces)
+
+
+def load_ter_cache(cache_path):
+    try:
+        with open(cache_path, 'rb') as file:
+            with np.load(file) as cache:
+                return {name: cache[name] for name in cache.files}
+    except Exception:
+        # missing or unreadable, the caller starts over
+        return None
+
+
+def save_ter_cache(cache_path, key, terrain, face_hashes):
+    with open(cache_path, 'wb') as file:
+        np.savez(file, key=key, face_hashes=face_hashes, section_sizes=terrain.section_sizes, section_faces=terrain.section_faces)
+
+
+def update_terrain_bound(bound, cache_path, bnds_min=None, bnds_max=None, progress=None, cell_size=TER_CELL_SIZE):
+    """make_terrain_bound, keeping the section groups and a hash of every
+    face in a sidecar file at cache_path. While the grid and face count stay
+    the same, only the faces whose hash changed since the last call are
+    tested again."""
+    bnds_min, bnds_max = terrain_extents(bound, bnds_min, bnds_max)
+    ter_grid = make_ter_grid(bnds_min, bnds_max, cell_size)
+
+    loop_co = bound.loop_co()
+    edge_co = bound.edge_co()
+    face_hashes = hash_faces(loop_co, edge_co, bound.face_starts, bound.face_sizes)
+    key = np.concatenate((bnds_min, bnds_max, [ter_grid.width_sections, ter_grid.depth_sections, bound.num_faces, TER_CACHE_VERSION]))
+
+    cache = load_ter_cache(cache_path)
+    if cache is None or not np.array_equal(cache["key"], key) or len(cache["face_hashes"]) != bound.num_faces:
+        terrain = make_terrain_bound(bound, bnds_min, bnds_max, progress, cell_size)
+        save_ter_cache(cache_path, key, terrain, face_hashes)
+        return terrain
+
+    # clean faces keep their sections, changed faces are tested again
+    dirty = cache["face_hashes"] != face_hashes
+    sections = np.repeat(np.arange(ter_grid.num_sections), cache["section_sizes"])
+    faces = cache["section_faces"]
+    keep = ~dirty[faces]
+
+    hit_sections, hit_faces = ter_grid.face_hits(loop_co, edge_co, bound.face_starts, bound.face_sizes, np.flatnonzero(dirty), progress)
+    sections = np.concatenate((sections[keep], hit_sections))
+    faces = np.concatenate((faces[keep], hit_faces))
+
+    # groups are ascending, same as a full pass
+    order = np.argsort(faces, kind='stable')
+    ter_grid.set_groups(sections[order], faces[order])
+    terrain = TerrainBound(bound.num_faces, bnds_min, bnds_max, ter_grid.width_sections, 1, ter_grid.depth_sections,
+                           ter_grid.section_sizes, ter_grid.section_faces)
+
+    save_ter_cache(cache_path, key, terrain, face_hashes)
+    return terrain
+
+
+TER_INDEX_DTYPE = np.dtype('<u2')
+TER_INDEX_LIMIT = 0xFFFF
+
+# version, face count, grid, poly index count, inverse cell size and box
+TER_HEADER = struct.Struct('<fLLBfffLLLLLfffffffff')
+
+
+def make_ter_tables(terrain):
+    """The section start, section size and poly index tables as one
+    uint16 buffer, raises if any value doesn't fit the format"""
+    section_starts = terrain.section_starts
+    section_sizes = terrain.section_sizes
+    section_faces = terrain.section_faces
+
+    if terrain.num_faces - 1 > TER_INDEX_LIMIT:
+      raise Exception('BOUND is too large for TER, it has %d faces and TER can reference at most %d.' % (terrain.num_faces, TER_INDEX_LIMIT + 1))
+    if len(section_sizes) > 0 and section_sizes.max() > TER_INDEX_LIMIT:
+      raise Exception('BOUND is too dense for TER, a section touches %d faces and TER allows at most %d.' % (section_sizes.max(), TER_INDEX_LIMIT))
+    if len(section_starts) > 0 and section_starts.max() > TER_INDEX_LIMIT:
+      raise Exception('BOUND is too large for TER, its sections hold %d poly indices and a section must start within the first %d.' % (len(section_faces), TER_INDEX_LIMIT + 1))
+    if len(section_faces) > 0 and (section_faces.min() < 0 or section_faces.max() > TER_INDEX_LIMIT):
+      raise Exception('TER poly index out of range.')
+
+    tables = np.empty(len(section_starts) + len(section_sizes) + len(section_faces), dtype=TER_INDEX_DTYPE)
+    tables[:len(section_starts)] = section_starts
+    tables[len(section_starts):len(section_starts) + len(section_sizes)] = section_sizes
+    tables[len(section_starts) + len(section_sizes):] = section_faces
+    return tables
+
+
+def write_ter(file, terrain):
+    bnds_min = terrain.bnds_min
+    bnds_max = terrain.bnds_max
+
+    # checked before anything is written
+    with instrumentation.current().stage("tables"):
+      tables = make_ter_tables(terrain)
+
+    # header
+    file.write(struct.pack('<f', 1.1))
+    file.write(struct.pack('<LLB', terrain.num_faces, 0, 0))
+
+    # boundbox
+    bnd_width = math.fabs(bnds_max[0] - bnds_min[0])
+    bnd_height = math.fabs(bnds_max[2] - bnds_min[2])
+    bnd_depth = math.fabs(bnds_max[1] - bnds_min[1])
+
+    file.write(struct.pack('<fff', bnd_width, bnd_height, bnd_depth))
+
+    # section data
+    file.write(struct.pack('<LLLL', terrain.width_sections, terrain.height_sections, terrain.depth_sections, terrain.num_sections))
+
+    # continue writing more binary information about boxes and stuff
+    file.write(struct.pack('<L', len(terrain.section_faces)))
+
+    if bnd_width == 0:
+      file.write(struct.pack('<f', float('Inf')))
+    else:
+      file.write(struct.pack('<f', terrain.width_sections / bnd_width))
+
+    file.write(struct.pack('<f', 1))
+
+    if bnd_depth == 0:
+      file.write(struct.pack('<f', float('Inf')))
+    else:
+      file.write(struct.pack('<f', terrain.depth_sections / bnd_depth))
+
+    file.write(struct.pack('<ffffff', -bnds_max[0], bnds_min[2], bnds_min[1], -bnds_min[0], bnds_max[2], bnds_max[1]))
+
+    # write index info
+    file.write(tables.tobytes())
+
+
+def read_ter(filepath):
+    """Read a TER file back into a TerrainBound"""
+    with open(filepath, 'rb') as file:
+        buffer = file.read()
+
+    header = TER_HEADER
+    if len(buffer) < header.size:
+        raise Exception('TER file is truncated.')
+
+    fields = header.unpack_from(buffer, 0)
+    num_faces = fields[1]
+    width_sections, height_sections, depth_sections, num_sections, num_indices = fields[7:12]
+    box = fields[15:21]
+    if num_sections != width_sections * height_sections * depth_sections:
+        raise Exception('TER section count does not match its grid.')
+
+    tables_offset = header.size
+    if len(buffer) < tables_offset + ((num_sections * 2) + num_indices) * 2:
+        raise Exception('TER file is truncated.')
+
+    section_starts = np.frombuffer(buffer, TER_INDEX_DTYPE, num_sections, tables_offset).astype(np.int64)
+    section_sizes = np.frombuffer(buffer, TER_INDEX_DTYPE, num_sections, tables_offset + (num_sections * 2)).astype(np.int64)
+    indices = np.frombuffer(buffer, TER_INDEX_DTYPE, num_indices, tables_offset + (num_sections * 4)).astype(np.int64)
+    if (section_starts + section_sizes > num_indices).any():
+        raise Exception('TER section runs past the index list.')
+
+    # sections normally follow each other, gather them if they don't
+    if np.array_equal(section_starts, np.cumsum(section_sizes) - section_sizes) and section_sizes.sum() == num_indices:
+        section_faces = indices
+    else:
+        section_faces = indices[np.repeat(section_starts, section_sizes) + np.arange(int(section_sizes.sum())) -
+                                np.repeat(np.cumsum(section_sizes) - section_sizes, section_sizes)]
+
+    # the box is stored in bound space
+    bnds_min = np.array((-box[3], box[2], box[1]), dtype=np.float64)
+    bnds_max = np.array((-box[0], box[5], box[4]), dtype=np.float64)
+    return TerrainBound(num_faces, bnds_min, bnds_max, width_sections, height_sections, depth_sections, section_sizes, section_faces)
+
+
+# faces per section histogram bins, the last one is open ended
+TER_HISTOGRAM_EDGES = (0, 1, 2, 5, 9, 17, 33, 65, 129, 257)
+
+
+def ter_quality(terrain):
+    """Statistics of the section groups of a TerrainBound, as a JSON ready
+    dict, with a "warnings" list of the ones likely to be slow in game"""
+    section_sizes = np.asarray(terrain.section_sizes, dtype=np.int64)
+    num_sections = len(section_sizes)
+    poly_indices = int(section_sizes.sum())
+
+    counts = np.histogram(section_sizes, bins=list(TER_HISTOGRAM_EDGES) + [max(int(section_sizes.max(initial=0)), TER_HISTOGRAM_EDGES[-1]) + 1])[0]
+    histogram = [{"min": low, "max": high - 1 if high is not None else None, "sections": int(count)}
+                 for low, high, count in zip(TER_HISTOGRAM_EDGES, list(TER_HISTOGRAM_EDGES[1:]) + [None], counts)]
+
+    percentiles = np.percentile(section_sizes, (50, 90, 99)) if num_sections > 0 else (0, 0, 0)
+    quality = {
+        "width_sections": terrain.width_sections,
+        "height_sections": terrain.height_sections,
+        "depth_sections": terrain.depth_sections,
+        "sections": num_sections,
+        "faces": terrain.num_faces,
+        "poly_indices": poly_indices,
+        "duplicate_ratio": poly_indices / max(terrain.num_faces, 1),
+        "empty_fraction": float((section_sizes == 0).mean()) if num_sections > 0 else 0.0,
+        "mean_section": float(section_sizes.mean()) if num_sections > 0 else 0.0,
+        "p50_section": float(percentiles[0]),
+        "p90_section": float(percentiles[1]),
+        "p99_section": float(percentiles[2]),
+        "max_section": int(section_sizes.max(initial=0)),
+        # a point anywhere over the grid, sections are the same size
+        "point_query_faces": float(section_sizes.mean()) if num_sections > 0 else 0.0,
+        # a point on the bound itself, crowded sections are hit more often
+        "surface_query_faces": float((section_sizes.astype(np.float64) ** 2).sum() / max(poly_indices, 1)),
+        "bytes": TER_HEADER.size + (((2 * num_sections) + poly_indices) * TER_INDEX_DTYPE.itemsize),
+        "histogram": histogram,
+    }
+
+    warnings = []
+    if quality["max_section"] > TER_WARN_SECTION_FACES:
+        warnings.append("a section holds %d faces, more than %d" % (quality["max_section"], TER_WARN_SECTION_FACES))
+    if quality["surface_query_faces"] > TER_WARN_QUERY_FACES:
+        warnings.append("queries on the bound test about %.1f faces, more than %d" % (quality["surface_query_faces"], TER_WARN_QUERY_FACES))
+    if quality["duplicate_ratio"] > TER_WARN_DUPLICATE_RATIO:
+        warnings.append("faces are listed in %.1f sections on average, more than %g" % (quality["duplicate_ratio"], TER_WARN_DUPLICATE_RATIO))
+    if poly_indices > TER_INDEX_LIMIT:
+        warnings.append("%d poly indices, more than the format's %d" % (poly_indices, TER_INDEX_LIMIT))
+    quality["warnings"] = warnings
+    return quality
+
+
+def format_ter_quality(quality):
+    """Lines of text summing up a ter_quality report"""
+    lines = ["%d x %d sections, %.0f%% empty" % (quality["width_sections"], quality["depth_sections"], quality["empty_fraction"] * 100),
+             "%d poly indices for %d faces, %.2f per face" % (quality["poly_indices"], quality["faces"], quality["duplicate_ratio"]),
+             "faces per section: mean %.1f, p50 %g, p90 %g, p99 %g, max %d" % (quality["mean_section"], quality["p50_section"], quality["p90_section"],
+                                                                              quality["p99_section"], quality["max_section"]),
+             "faces per query: %.1f over the grid, %.1f on the bound" % (quality["point_query_faces"], quality["surface_query_faces"]),
+             "%d bytes" % (quality["bytes"])]
+    for bucket in quality["histogram"]:
+        label = "%d+" % bucket["min"] if bucket["max"] is None else "%d" % bucket["min"] if bucket["min"] == bucket["max"] else "%d-%d" % (bucket["min"], bucket["max"])
+        lines.append("  %s faces: %d sections" % (label, bucket["sections"]))
+    lines.extend("WARNING: " + warning for warning in quality["warnings"])
+    return lines
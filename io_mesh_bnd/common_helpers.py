@@ -1,4 +1,9 @@
-import bpy
+import bpy, os, time
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+
+import io_mesh_bnd.bound_io as bound_io
+import io_mesh_bnd.instrumentation as instrumentation
 
 def get_material_color(name):
   material_colors = {
@@ -47,4 +52,175 @@ def create_material(name):
   # setup bsdf
   bsdf.inputs["Color"].default_value = material_color
   
-  return mtl
\ No newline at end of file
+  return mtl
+
+
+# materials created this session, lowercased bound material name -> datablock
+# name. Names are kept rather than datablocks, those don't survive undo.
+material_registry = {}
+
+
+def get_material(name, reuse=True):
+  """Returns the material for a bound surface name, creating it the first
+  time it's seen this session. With reuse off a new one is made every time."""
+  name_l = name.lower()
+  if reuse:
+    mtl = bpy.data.materials.get(material_registry.get(name_l, ""))
+    if mtl is not None and mtl.get("bnd_material") == name_l:
+      return mtl
+
+  mtl = create_material(name)
+  mtl["bnd_material"] = name_l
+  material_registry[name_l] = mtl.name
+  return mtl
+
+
+def canonical_faces(faces):
+  # rotate each row so it starts at its lowest vertex, then pick the winding
+  # with the lower second vertex, so faces over the same cycle compare equal
+  size = faces.shape[1]
+  first = np.argmin(faces, axis=1)
+  faces = np.take_along_axis(faces, (first[:, None] + np.arange(size)) % size, axis=1)
+  flip = faces[:, 1] > faces[:, -1]
+  faces[flip, 1:] = faces[flip, :0:-1]
+  return faces
+
+
+def validate_faces(num_verts, loop_vertices, face_sizes):
+  """Returns a mask of the faces that can be created, printing the reason
+  for every face that can't (the same cases bmesh.faces.new rejects)"""
+  valid = np.ones(len(face_sizes), dtype=bool)
+  face_starts = np.cumsum(face_sizes) - face_sizes
+
+  for size in np.unique(face_sizes).tolist():
+    face_ids = np.flatnonzero(face_sizes == size)
+    faces = loop_vertices[face_starts[face_ids, None] + np.arange(size)]
+
+    # out of range
+    bad_index = ((faces < 0) | (faces >= num_verts)).any(axis=1)
+    for face_id in face_ids[bad_index].tolist():
+      print("face %d: vertex index out of range" % face_id)
+
+    # same vertex used twice
+    faces_sorted = np.sort(faces, axis=1)
+    bad_verts = ~bad_index & (faces_sorted[:, 1:] == faces_sorted[:, :-1]).any(axis=1)
+    for face_id in face_ids[bad_verts].tolist():
+      print("face %d: found the same vertex used multiple times" % face_id)
+
+    # face already exists
+    good = ~(bad_index | bad_verts)
+    good_ids = face_ids[good]
+    _, first = np.unique(canonical_faces(faces[good]), axis=0, return_index=True)
+    duplicate = np.ones(len(good_ids), dtype=bool)
+    duplicate[first] = False
+    for face_id in good_ids[duplicate].tolist():
+      print("face %d: face already exists" % face_id)
+
+    valid[face_ids[bad_index | bad_verts]] = False
+    valid[good_ids[duplicate]] = False
+
+  return valid
+
+
+def create_bound_object(bound, reuse_materials=True, name='BOUND', collection=None):
+  """Build the BOUND mesh object in one go from a bound_io.Bound read
+  from a file, so its faces own consecutive loops. The object goes in
+  collection, or the scene collection."""
+  report = instrumentation.current()
+  vertices = np.asarray(bound.vertices, dtype=np.float32)
+  loop_vertices = bound.loop_vertices
+  face_sizes = bound.face_sizes
+  material_indices = bound.material_indices
+
+  # drop faces bmesh wouldn't have created
+  with report.stage("validate"):
+    valid = validate_faces(len(vertices), loop_vertices, face_sizes)
+  report.count("invalid_faces", int(len(valid) - valid.sum()))
+  if not valid.all():
+    loop_vertices = loop_vertices[np.repeat(valid, face_sizes)]
+    face_sizes = face_sizes[valid]
+    material_indices = material_indices[valid]
+
+  face_starts = np.cumsum(face_sizes, dtype=np.int32) - face_sizes
+
+  # add a mesh and link it to the scene
+  me = bpy.data.meshes.new('BoundMesh')
+  ob = bpy.data.objects.new(name, me)
+
+  with report.stage("vertices"):
+    me.vertices.add(len(vertices))
+    me.vertices.foreach_set("co", vertices.ravel())
+
+  with report.stage("faces"):
+    me.loops.add(len(loop_vertices))
+    me.loops.foreach_set("vertex_index", loop_vertices)
+
+    me.polygons.add(len(face_sizes))
+    me.polygons.foreach_set("loop_start", face_starts)
+    if bpy.app.version < (4, 0, 0):
+      me.polygons.foreach_set("loop_total", face_sizes)
+    me.polygons.foreach_set("material_index", material_indices)
+    me.polygons.foreach_set("use_smooth", np.ones(len(face_sizes), dtype=bool))
+
+  with report.stage("materials"):
+    for material_name in bound.material_names:
+      me.materials.append(get_material(material_name, reuse_materials))
+
+  # calculate edges and normals
+  with report.stage("update"):
+    me.update(calc_edges=True)
+
+  report.count("vertices", len(vertices))
+  report.count("faces", len(face_sizes))
+
+  if collection is None:
+    collection = bpy.context.scene.collection
+  collection.objects.link(ob)
+  bpy.context.view_layer.objects.active = ob
+  return ob
+
+
+def selected_filepaths(filepath, files, directory, extension, whole_directory=False):
+  """Every file picked in the file browser, every file with extension in
+  the directory if whole_directory is set, otherwise just filepath. The
+  directory defaults to the one holding filepath."""
+  if not directory and filepath:
+    directory = os.path.dirname(os.path.abspath(filepath))
+
+  if whole_directory and directory:
+    return sorted(os.path.join(directory, name) for name in os.listdir(directory) if name.lower().endswith(extension))
+
+  names = [file.name for file in (files or []) if file.name]
+  if directory and len(names) > 0:
+    return [os.path.join(directory, name) for name in names]
+  return [filepath]
+
+
+def read_bounds(filepaths):
+  """Parse several bounds on a thread pool, in filepaths order"""
+  with ThreadPoolExecutor(max_workers=min(len(filepaths), os.cpu_count() or 1)) as executor:
+    return list(executor.map(bound_io.bound_cache.read, filepaths))
+
+
+def load_bounds(filepaths, reuse_materials=True):
+  """Import several bounds into one new collection, named after their
+  files. Every file is decoded before any object is made. Returns
+  (filepath, bound, object) for each file."""
+  print("importing %d bounds..." % (len(filepaths)))
+  time1 = time.perf_counter()
+
+  with instrumentation.start("import_bounds") as report:
+    bounds = report.run("parse", read_bounds, filepaths)
+
+    collection = bpy.data.collections.new(os.path.basename(os.path.dirname(filepaths[0])) or "Bounds")
+    bpy.context.scene.collection.children.link(collection)
+
+    result = []
+    with report.stage("build_mesh"):
+      for filepath, bound in zip(filepaths, bounds):
+        name = os.path.splitext(os.path.basename(filepath))[0]
+        result.append((filepath, bound, create_bound_object(bound, reuse_materials, name, collection)))
+
+  report.print_stages()
+  print(" done in %.4f sec." % (time.perf_counter() - time1))
+  return result
@@ -7,12 +7,15 @@
 #
 # ##### END LICENSE BLOCK #####
 
-import os, time, struct, math, sys
+import os, time, sys, threading
 import os.path as path
 
-import bpy, bmesh, mathutils
+import bpy, mathutils
 
-from io_mesh_bnd.ter_section import TerSection
+import io_mesh_bnd.bound_io as bound_io
+import io_mesh_bnd.export_cache as export_cache
+import io_mesh_bnd.instrumentation as instrumentation
+from io_mesh_bnd.mesh_buffers import MeshBuffers
 
 # globals
 global apply_modifiers_G
@@ -43,365 +46,242 @@ def bounds(obj):
     o_details = collections.namedtuple('object_details', 'x y z')
     return o_details(**originals)
 
-def get_undupe_name(name):
-    nidx = name.find('.')
-    return name[:nidx] if nidx != -1 else name
+class BoundExportData:
+    """The BOUND object evaluated and read once into a bound_io.Bound,
+    shared by all the writers"""
 
+    def __init__(self, ob):
+        report = instrumentation.current()
 
-def find_object_ci(name):
-    for obj in bpy.data.objects:
-        if obj.name.lower() == name.lower() and obj.type == 'MESH':
-            return obj
-    return None
-
-def write_char_array(file, w_str, length):
-    file.write(bytes(w_str, 'utf-8'))
-    file.write(bytes('\x00' * (length - len(w_str )), 'utf-8'))
-
+        # create temp mesh
+        global apply_modifiers_G
+        if apply_modifiers_G:
+            with report.stage("depsgraph"):
+                dg = bpy.context.evaluated_depsgraph_get()
+                mesh_owner = ob.evaluated_get(dg)
+        else:
+            mesh_owner = ob
 
-def point_in_polygon(p, vertices):
-    n = len(vertices)
-    inside =False
+        with report.stage("to_mesh"):
+            temp_mesh = mesh_owner.to_mesh()
+        try:
+            with report.stage("read_buffers"):
+                buffers = MeshBuffers(temp_mesh)
+        finally:
+            mesh_owner.to_mesh_clear()
 
-    x, y = p
-    p1x,p1y = vertices[0]
-    for i in range(n+1):
-        p2x,p2y = vertices[i % n]
-        if y > min(p1y,p2y):
-            if y <= max(p1y,p2y):
-                if x <= max(p1x,p2x):
-                    if p1y != p2y:
-                        xinters = (y-p1y)*(p2x-p1x)/float((p2y-p1y))+p1x
-                    if p1x == p2x or x <= xinters:
-                        inside = not inside
-        p1x,p1y = p2x,p2y
+        material_names = [get_undupe_name(ms.material.name) for ms in ob.material_slots]
+        self.bound = bound_io.Bound(buffers.vertices, buffers.loop_vertices, buffers.face_sizes, buffers.material_indices,
+                                    material_names, face_starts=buffers.face_starts,
+                                    loop_edge_vertices=buffers.edge_vertices[buffers.loop_edges])
 
-    return inside
-
-
-def write_binary_material(file, name):
-    write_char_array(file, name, 32)
-    file.write(struct.pack('ff', 0.1, 0.5))
-    write_char_array(file, 'none', 32)
-    write_char_array(file, 'none', 32)
-    
+        bnds = bounds(ob)
+        self.bnds_min = (bnds.x.min, bnds.y.min, bnds.z.min)
+        self.bnds_max = (bnds.x.max, bnds.y.max, bnds.z.max)
 
-def make_ascii_material(name):
-    return "mtl " + name + " {\n\telasticity: 0.100000\n\tfriction: 0.500000\n\teffect: none\n\tsound: none\n}\n"
+        report.count("vertices", self.bound.num_vertices)
+        report.count("faces", self.bound.num_faces)
 
 
-def point_in_bounds(bmin, bmax, p):
-    return p[0] >= bmin[0] and p[1] >= bmin[1] and p[0] <= bmax[0] and p[1] <= bmax[1]
+def get_undupe_name(name):
+    nidx = name.find('.')
+    return name[:nidx] if nidx != -1 else name
 
-    
-def edges_intersect(p1, p2, p3, p4):
-    #https://stackoverflow.com/a/24392281
-    #returns true if the line from (a,b)->(c,d) intersects with (p,q)->(r,s)
-    a = p1[0]
-    b = p1[1]
-    c = p2[0]
-    d = p2[1]
-    p = p3[0]
-    q = p3[1]
-    r = p4[0]
-    s = p4[1]
-    
-    det = (c - a) * (s - q) - (r - p) * (d - b);
-    if abs(det) < 0.001:
-      return False
-    else:
-      lmbda = ((s - q) * (r - a) + (p - r) * (s - b)) / det
-      gamma = ((b - d) * (r - a) + (c - a) * (s - b)) / det
-      return (0 < lmbda and lmbda < 1) and (0 < gamma and gamma < 1)
-      
-def bounds_intersect(amin, amax, bmin, bmax):
-    return amin[0] <= bmax[0] and amax[0] >= bmin[0] and amin[1] <= bmax[1] and amax[1] >= bmin[1]
 
+def find_object_ci(name):
+    for obj in bpy.data.objects:
+        if obj.name.lower() == name.lower() and obj.type == 'MESH':
+            return obj
+    return None
 
 ######################################################
 # EXPORT MAIN FILES
 ######################################################
-def export_terrain_bound(file, ob):
-    # create temp mesh
-    temp_mesh = None
-    global apply_modifiers_G
-    if apply_modifiers_G:
-        dg = bpy.context.evaluated_depsgraph_get()
-        eval_obj = ob.evaluated_get(dg)
-        temp_mesh = eval_obj.to_mesh()
+def export_terrain_bound(file, bound_data, cache_path=None, progress=None, auto_grid=False):
+    cell_size = bound_io.TER_CELL_SIZE
+    if auto_grid:
+        estimate = instrumentation.current().run("tune_grid", bound_io.tune_ter_cell_size, bound_data.bound, bound_data.bnds_min, bound_data.bnds_max)
+        cell_size = estimate["cell_size"]
+        print(" TER grid: %gm sections, %d x %d, about %.1f faces per lookup and %d poly indices." % (cell_size, estimate["width_sections"], estimate["depth_sections"],
+                                                                                                   estimate["faces_per_lookup"], estimate["poly_indices"]))
+
+    if cache_path is not None:
+        terrain = bound_io.update_terrain_bound(bound_data.bound, cache_path, bound_data.bnds_min, bound_data.bnds_max, progress, cell_size)
     else:
-        temp_mesh = ob.to_mesh()
-    
-    # get bmesh
-    bm = bmesh.new()
-    bm.from_mesh(temp_mesh)
-    bm.verts.ensure_lookup_table()
-    bm.faces.index_update()
-    
-    # header
-    file.write(struct.pack('f', 1.1))
-    file.write(struct.pack('LLB', len(bm.faces), 0, 0))
-    
-    # boundbox
-    bnds = bounds(ob)
+        terrain = bound_io.make_terrain_bound(bound_data.bound, bound_data.bnds_min, bound_data.bnds_max, progress, cell_size)
+    bound_io.write_ter(file, terrain)
 
-    bnds_min = (bnds.x.min, bnds.y.min)
-    bnds_max = (bnds.x.max, bnds.y.max)
-    
-    bnd_width = math.fabs(bnds.x.max - bnds.x.min)
-    bnd_height = math.fabs(bnds.z.max - bnds.z.min)
-    bnd_depth = math.fabs(bnds.y.max - bnds.y.min)
+    quality = bound_io.ter_quality(terrain)
+    print(" TER: %.1f faces per query on the bound, at most %d in a section, %.2f poly indices per face." % (quality["surface_query_faces"], quality["max_section"],
+                                                                                                         quality["duplicate_ratio"]))
+    for warning in quality["warnings"]:
+        print(" WARNING: TER " + warning)
 
-    file.write(struct.pack('fff', bnd_width, bnd_height, bnd_depth))
-    
-    # section data  
-    width_sections = max(1, math.ceil(bnd_width / 10))
-    depth_sections = max(1, math.ceil(bnd_depth / 10))
-    height_sections = 1
-    
-    total_sections = width_sections * height_sections * depth_sections
-    individual_section_width = (1 / width_sections) * bnd_width
-    individual_section_depth = (1 / depth_sections) * bnd_depth
-    
-    file.write(struct.pack('LLLL', width_sections, height_sections, depth_sections, total_sections))
-    
-    #calculate intersecting polygons + poly indices
-    poly_indices = 0
-    ter_sections = []
-    
-    # create sections structures
-    for d in range(depth_sections):
-      for w in reversed(range(width_sections)):
-        BOUNDS_INFLATION = 0.1
-        
-        section_bnds_min = ((bnds_min[0] + (w * individual_section_width)) - BOUNDS_INFLATION, (bnds_min[1] + (d * individual_section_depth)) - BOUNDS_INFLATION)
-        section_bnds_max = ((bnds_min[0] + ((w + 1) * individual_section_width)) + BOUNDS_INFLATION, (bnds_min[1] + ((d + 1) * individual_section_depth)) + BOUNDS_INFLATION)
-
-        section_edges = (((section_bnds_min[0], section_bnds_min[1]), (section_bnds_max[0], section_bnds_min[1])), ((section_bnds_max[0], section_bnds_min[1]), (section_bnds_max[0], section_bnds_max[1])),
-                         ((section_bnds_min[0], section_bnds_max[1]), (section_bnds_max[0], section_bnds_max[1])), ((section_bnds_min[0], section_bnds_min[1]), (section_bnds_min[0], section_bnds_max[1])))
-        section_poly = ((section_bnds_min[0], section_bnds_min[1]), (section_bnds_max[0], section_bnds_min[1]), (section_bnds_max[0], section_bnds_max[1]), (section_bnds_min[0], section_bnds_max[1]))
-       
-        #TerSection(self, bounds_min, bounds_max, edges, polygon):
-        ter_section = TerSection(section_bnds_min, section_bnds_max, section_edges, section_poly)
-        ter_sections.append(ter_section)
-    
-    # loop through faces and find faces in each section
-    for f in bm.faces:
-      # compute bounds
-      face_2d = []
-      for loop in f.loops:
-        face_2d.append((loop.vert.co[0], loop.vert.co[1])) 
-      
-      face_min = [9999, 9999]
-      face_max = [-9999, -9999]
-      for pt in face_2d:
-        face_min[1] = min(face_min[1], pt[1])
-        face_min[0] = min(face_min[0], pt[0])
-        face_max[1] = max(face_max[1], pt[1])
-        face_max[0] = max(face_max[0], pt[0])
-      
-      # check each section to see if the face is contained
-      for section in ter_sections:
-        section_bnds_min = section.bounds[0]
-        section_bnds_max = section.bounds[1]
-        
-        if not bounds_intersect(face_min, face_max, section_bnds_min, section_bnds_max):
-          continue
-          
-        isect = False
-        
-        # face checks
-        # check if this polygon surrounds this section
-        section_poly = section.polygon
-        for p in section_poly:
-          isect |= point_in_polygon(p, face_2d)
-          if isect:
-            break
-              
-        # edge checks
-        if not isect:
-          for edge in f.edges:
-            if isect:
-                break
-                
-            v0_3d = edge.verts[0]
-            v1_3d = edge.verts[1]
-            v0 = (v0_3d.co[0], v0_3d.co[1])
-            v1 = (v1_3d.co[0], v1_3d.co[1])
-            
-            isect |= point_in_bounds(section_bnds_min, section_bnds_max, v0)
-            isect |= point_in_bounds(section_bnds_min, section_bnds_max, v1)
-            
-            # more expensive edge-edge intersect testing (only if edge is not vertical)
-            edge_is_vertical = v0[0] == v1[0] and v0[1] == v1[1]
-            if not isect and not edge_is_vertical:
-                section_edges = section.edges
-                for se in section_edges:
-                    isect |= edges_intersect(se[0], se[1], v0, v1)
-                    if isect:
-                        break
-            
-        if isect:
-          section.group.append(f.index)
-          poly_indices += 1
-        
-    # continue writing more binary information about boxes and stuff
-    file.write(struct.pack('L', poly_indices))
-    
-    if bnd_width == 0:
-      file.write(struct.pack('f', float('Inf')))
-    else:
-      file.write(struct.pack('f', width_sections / bnd_width))
-      
-    file.write(struct.pack('f', 1))
-      
-    if bnd_depth == 0:
-      file.write(struct.pack('f', float('Inf')))
-    else:
-      file.write(struct.pack('f', depth_sections / bnd_depth))
-      
-    file.write(struct.pack('ffffff',  -bnds.x.max, bnds.z.min, bnds.y.min, -bnds.x.min, bnds.z.max ,bnds.y.max))
-    
-    # write index info
-    tot_ind = 0
-    for i in range(total_sections):
-      section_group = ter_sections[i].group
-      file.write(struct.pack('H', tot_ind))
-      tot_ind += len(section_group)
-
-    for i in range(total_sections):
-      section_group = ter_sections[i].group
-      file.write(struct.pack('H', len(section_group)))
-      
-    for i in range(total_sections):
-      section_group = ter_sections[i].group
-      for j in range(len(section_group)):
-          file.write(struct.pack('H', section_group[j]))
-      
-    # finish off
-    bm.free()
-    file.close()
-    return
-    
-def export_binary_bound(file, ob):
-    # create temp mesh
-    temp_mesh = None
-    global apply_modifiers_G
-    if apply_modifiers_G:
-        dg = bpy.context.evaluated_depsgraph_get()
-        eval_obj = ob.evaluated_get(dg)
-        temp_mesh = eval_obj.to_mesh()
-    else:
-        temp_mesh = ob.to_mesh()
-        
-    # get bmesh
-    bm = bmesh.new()
-    bm.from_mesh(temp_mesh)
-    
-    real_num_materials = len(ob.material_slots)
-    num_materials = max(real_num_materials, 1)
-    
-    # header
-    file.write(struct.pack('B', 1))
-    file.write(struct.pack('LLL', len(bm.verts), num_materials, len(bm.faces)))
-    
-    # vertices
-    for v in bm.verts:
-        file.write(struct.pack('fff', v.co[0] * -1, v.co[2], v.co[1]))
 
-    # materials
-    
-    if real_num_materials > 0:
-        for ms in ob.material_slots:
-            mat = ms.material
-            write_binary_material(file, get_undupe_name(mat.name))
-    else:
-        write_binary_material(file, "default")
-
-    # faces
-    bm.verts.index_update()
-    for fcs in bm.faces:
-        material_index = max(0, fcs.material_index)
-        if len(fcs.loops) == 3:
-            file.write(struct.pack('HHHHH', fcs.loops[0].vert.index, fcs.loops[1].vert.index, fcs.loops[2].vert.index, 0, material_index))
-        elif len(fcs.loops) == 4:
-            indices = [fcs.loops[0].vert.index, fcs.loops[1].vert.index, fcs.loops[2].vert.index, fcs.loops[3].vert.index]
-            
-            # last index can't be 0 in a quad, so shift this polygon around if that's the case
-            if indices[3] == 0:
-                indices_copy = indices.copy()
-                indices = [indices_copy[3], indices_copy[0], indices_copy[1], indices_copy[2]]
-            
-            file.write(struct.pack('HHHHH', indices[0], indices[1], indices[2], indices[3], material_index))
-    
-    # finish off
-    bm.free()
-    file.close()
-    return
+######################################################
+# EXPORT JOB
+######################################################
+class ExportCancelled(Exception):
+    pass
+
+
+def write_output(report, name, filepath, mode, func, *args):
+    with report.stage(name):
+        with open(filepath, mode) as file:
+            func(file, *args)
+            with report.stage("flush"):
+                file.flush()
+    report.count("bytes_written", os.path.getsize(filepath))
+
+
+class ExportJob:
+    """Writes the files of an evaluated BOUND, in place with run() or on a
+    worker thread with start(). Every file is written next to its target
+    and they're only moved into place once all of them are done, so a
+    failed or cancelled export leaves the previous files alone."""
+
+    # rough share of the work per file, the TER section pass dominates
+    OUTPUT_WEIGHTS = {"bnd": 1, "bbnd": 1, "ter": 4}
+
+    def __init__(self, bound_data, outputs, terrain_cache=None, cache=None, cache_key=None, auto_terrain_grid=False):
+        self.bound_data = bound_data
+        self.outputs = outputs
+        self.terrain_cache = terrain_cache
+        self.auto_terrain_grid = auto_terrain_grid
+        self.cache = cache
+        self.cache_key = cache_key
+
+        self.progress = 0.0
+        self.step_first = 0.0
+        self.step_span = 0.0
+        self.report = None
+        self.error = None
+        self.thread = None
+        self.cancel_event = threading.Event()
+
+    @property
+    def done(self):
+        return self.thread is not None and not self.thread.is_alive()
+
+    @property
+    def cancelled(self):
+        return isinstance(self.error, ExportCancelled)
+
+    def cancel(self):
+        self.cancel_event.set()
+
+    def step(self, fraction):
+        """Progress callback of the current file, raises ExportCancelled
+        once cancel() was called"""
+        if self.cancel_event.is_set():
+            raise ExportCancelled('Export cancelled.')
+        self.progress = self.step_first + (self.step_span * min(max(fraction, 0.0), 1.0))
+
+    def start(self, evaluate_report=instrumentation.NULL_REPORT):
+        """Run on a worker thread, evaluate_report holds the stages already
+        run on the main thread"""
+        self.thread = threading.Thread(target=self.work, args=(evaluate_report,), name="bnd_export", daemon=True)
+        self.thread.start()
+
+    def work(self, evaluate_report):
+        # bpy is off limits here, everything it needs was read on the main thread
+        time1 = time.perf_counter() - evaluate_report.seconds
+        try:
+            with instrumentation.start("export") as report:
+                self.report = report
+                report.merge(evaluate_report)
+                self.run()
+        except Exception as e:
+            self.error = e
+            print(" export %s" % ("cancelled." if self.cancelled else "failed: %s" % e))
+            return
+
+        report.print_stages()
+        print(" done in %.4f sec." % (time.perf_counter() - time1))
+
+    def run(self):
+        report = instrumentation.current()
+        outputs = self.outputs
+        temp_paths = {name: filepath + ".part" for name, filepath in outputs.items()}
+
+        try:
+            # unchanged bounds are copied from the export cache
+            restored = self.cache is not None and report.run("cache", self.cache.restore, self.cache_key, temp_paths)
+            if restored:
+                print(" BOUND unchanged, reused cached export.")
+            else:
+                self.write_all(report, temp_paths)
+
+            self.step_first = 1.0
+            self.step(0.0)
+            for name, filepath in outputs.items():
+                os.replace(temp_paths[name], filepath)
+        finally:
+            for temp_path in temp_paths.values():
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+
+        if self.cache is not None and not restored and len(outputs) > 0:
+            report.run("cache_store", self.cache.store, self.cache_key, outputs)
+
+    def write_all(self, report, temp_paths):
+        bound = self.bound_data.bound
+        writers = {"bnd": ('w', bound_io.write_bnd, bound),
+                   "bbnd": ('wb', bound_io.write_bbnd, bound),
+                   "ter": ('wb', export_terrain_bound, self.bound_data, self.terrain_cache, self.step, self.auto_terrain_grid)}
+
+        total = sum(self.OUTPUT_WEIGHTS[name] for name in temp_paths)
+        for name, temp_path in temp_paths.items():
+            self.step_span = self.OUTPUT_WEIGHTS[name] / total
+            self.step(0.0)
+            mode, func, *args = writers[name]
+            write_output(report, name, temp_path, mode, func, *args)
+            self.step_first += self.step_span
 
 
-def export_bound(file, ob):
-    # create temp mesh
-    temp_mesh = None
-    global apply_modifiers_G
-    if apply_modifiers_G:
-        dg = bpy.context.evaluated_depsgraph_get()
-        eval_obj = ob.evaluated_get(dg)
-        temp_mesh = eval_obj.to_mesh()
-    else:
-        temp_mesh = ob.to_mesh()
-    
-    # get bmesh
-    bm = bmesh.new()
-    bm.from_mesh(temp_mesh)
+######################################################
+# EXPORT
+######################################################
+def make_export_job(filepath,
+                    export_binary,
+                    export_terrain,
+                    incremental_terrain,
+                    auto_terrain_grid,
+                    use_export_cache):
+    """Evaluate the BOUND object (main thread only), returns the ExportJob
+    writing its files"""
+    # find bound object
+    bound_obj = find_object_ci("BOUND")
+    if bound_obj is None:
+      raise Exception('No BOUND object in scene.')
 
-    real_num_materials = len(ob.material_slots)
-    num_materials = max(real_num_materials, 1)
-    
-    # header
-    bnd_file = "version: 1.01\nverts: " + str(len(bm.verts)) + "\nmaterials: " + str(num_materials) + "\nedges: 0\npolys: " + str(len(bm.faces)) + "\n\n"
+    # evaluate BOUND once for every format
+    bound_data = instrumentation.current().run("evaluate", BoundExportData, bound_obj)
 
-    # vertices
-    for v in bm.verts:
-        bnd_file += "v " + "{0:.6f}".format(v.co[0] * -1) + " " + "{0:.6f}".format(v.co[2]) + " " + "{0:.6f}".format(v.co[1]) + "\n"
+    outputs = {"bnd": filepath}
+    if export_binary:
+      outputs["bbnd"] = filepath[:-3] + "bbnd"
+    if export_terrain:
+      outputs["ter"] = filepath[:-3] + "ter"
 
-    bnd_file += "\n"
+    cache = export_cache.ExportCache() if use_export_cache else None
+    cache_key = None
+    if cache is not None:
+      cache_key = export_cache.bound_key(bound_data.bound, bound_data.bnds_min, bound_data.bnds_max,
+                                         export_binary, export_terrain, auto_terrain_grid, apply_modifiers_G)
 
-    # materials
-    if real_num_materials > 0:
-        for ms in ob.material_slots:
-            mat = ms.material
-            bnd_file += make_ascii_material(get_undupe_name(mat.name))
-    else:
-        bnd_file += make_ascii_material("default")
-        
-    bnd_file += "\n"
-
-    # faces
-    bm.verts.index_update()
-    for fcs in bm.faces:
-        material_index = max(0, fcs.material_index)
-        if len(fcs.loops) == 3:
-            bnd_file += "tri " + str(fcs.loops[0].vert.index) + "  " + str(fcs.loops[1].vert.index) + "  " + str(fcs.loops[2].vert.index) + "  " + str(material_index) + "\n"
-        elif len(fcs.loops) == 4:
-            bnd_file += "quad " + str(fcs.loops[0].vert.index) + "  " + str(fcs.loops[1].vert.index) + "  " + str(fcs.loops[2].vert.index) + "  " + str(fcs.loops[3].vert.index) + "  " + str(material_index) + "\n"
-            
-    # write BOUND
-    file.write(bnd_file)
-
-    # finish off
-    bm.free()
-    file.close()
-    return
+    terrain_cache = filepath[:-3] + "ter.cache" if incremental_terrain else None
+    return ExportJob(bound_data, outputs, terrain_cache, cache, cache_key, auto_terrain_grid)
 
 
-######################################################
-# EXPORT
-######################################################
 def save_bnd(filepath,
              export_binary,
              export_terrain,
+             incremental_terrain,
+             auto_terrain_grid,
+             use_export_cache,
              context):
+    """Export the BOUND object, returns the instrumentation report"""
 
     print("exporting BOUND: %r..." % (filepath))
 
@@ -409,39 +289,18 @@ def save_bnd(filepath,
         bpy.ops.object.select_all(action='DESELECT')
 
     time1 = time.perf_counter()
-    
 
-    # find bound object
-    bound_obj = find_object_ci("BOUND")
-    if bound_obj is None:
-      raise Exception('No BOUND object in scene.')
-    
-    # write bnd
-    file = open(filepath, 'w')
-    export_bound(file, bound_obj)
-    
-    if export_binary:
-      # write BBND
-      binfile = open(filepath[:-3] + "bbnd", 'wb')
-      export_binary_bound(binfile, bound_obj)
-    
-    if export_terrain:
-      # write TER
-      terfile = open(filepath[:-3] + "ter", 'wb')
-      export_terrain_bound(terfile, bound_obj)
-      
+    with instrumentation.start("export") as report:
+      job = make_export_job(filepath, export_binary, export_terrain, incremental_terrain, auto_terrain_grid, use_export_cache)
+      job.run()
+
     # bound export complete
+    report.print_stages()
     print(" done in %.4f sec." % (time.perf_counter() - time1))
+    return report
 
 
-def save(operator,
-         context,
-         filepath="",
-         export_binary=False,
-         export_terrain=False,
-         apply_modifiers=False
-         ):
-    
+def prepare_save(context, apply_modifiers):
     # set object modes
     for ob in context.scene.objects:
       if ob.type == 'MESH' and ob.name.lower() == "bound":
@@ -453,12 +312,55 @@ def save(operator,
     # set globals
     global apply_modifiers_G
     apply_modifiers_G = apply_modifiers
+
+
+def save(operator,
+         context,
+         filepath="",
+         export_binary=False,
+         export_terrain=False,
+         incremental_terrain=False,
+         auto_terrain_grid=False,
+         use_export_cache=False,
+         apply_modifiers=False
+         ):
+    
+    prepare_save(context, apply_modifiers)
     
     # save BND
     save_bnd(filepath,
              export_binary,
              export_terrain,
+             incremental_terrain,
+             auto_terrain_grid,
+             use_export_cache,
              context,
              )
 
     return {'FINISHED'}
+
+
+def save_background(operator,
+                    context,
+                    filepath="",
+                    export_binary=False,
+                    export_terrain=False,
+                    incremental_terrain=False,
+                    auto_terrain_grid=False,
+                    use_export_cache=False,
+                    apply_modifiers=False
+                    ):
+    """Evaluate the BOUND now and write its files on a worker thread,
+    returns the started ExportJob for the caller to poll"""
+    prepare_save(context, apply_modifiers)
+
+    print("exporting BOUND in the background: %r..." % (filepath))
+
+    if bpy.ops.object.select_all.poll():
+        bpy.ops.object.select_all(action='DESELECT')
+
+    # the evaluate stages go into the job's report
+    with instrumentation.start("export", sink=False) as evaluate_report:
+      job = make_export_job(filepath, export_binary, export_terrain, incremental_terrain, auto_terrain_grid, use_export_cache)
+    job.start(evaluate_report)
+    return job
@@ -0,0 +1,108 @@
+# ##### BEGIN LICENSE BLOCK #####
+#
+# This program is licensed under Creative Commons BY-NC-SA:
+# https://creativecommons.org/licenses/by-nc-sa/3.0/
+#
+# Created by Dummiesman, 2016-2020
+#
+# ##### END LICENSE BLOCK #####
+
+# On disk cache of exported bound files, keyed by a hash of the bound
+# arrays and export options so unchanged bounds are copied instead of
+# written again.
+
+import os, shutil, hashlib, tempfile
+import numpy as np
+
+# bump when the writers change their output
+EXPORT_CACHE_VERSION = 1
+
+DEFAULT_CACHE_DIR = os.path.join(tempfile.gettempdir(), "bnd_export_cache")
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+
+def bound_key(bound, *options):
+    """Hex digest of the bound arrays, material names and any extra export
+    options that change the output"""
+    digest = hashlib.blake2b(digest_size=20)
+    digest.update(repr((EXPORT_CACHE_VERSION, bound.material_names, options)).encode('utf-8'))
+    for array in (bound.vertices, bound.loop_vertices, bound.face_starts, bound.face_sizes, bound.material_indices):
+        array = np.ascontiguousarray(array)
+        digest.update(repr((array.dtype.str, array.shape)).encode('utf-8'))
+        digest.update(array.data)
+    return digest.hexdigest()
+
+
+class ExportCache:
+    """A directory of cache entries, one per key, each holding a copy of
+    every file written for it. Entries are evicted least recently used
+    first once the total size goes over max_bytes."""
+
+    def __init__(self, directory=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+
+    def entry_path(self, key):
+        return os.path.join(self.directory, key)
+
+    def restore(self, key, outputs):
+        """Copy the cached files of key to outputs, a dict of name -> path.
+        Returns False without touching anything if there's no complete entry."""
+        entry = self.entry_path(key)
+        sources = {name: os.path.join(entry, name) for name in outputs}
+        if not all(os.path.isfile(source) for source in sources.values()):
+            return False
+
+        for name, filepath in outputs.items():
+            shutil.copyfile(sources[name], filepath)
+
+        # mark as recently used
+        os.utime(entry)
+        return True
+
+    def store(self, key, outputs):
+        """Add copies of the files in outputs under key"""
+        os.makedirs(self.directory, exist_ok=True)
+        entry = self.entry_path(key)
+
+        # build the entry aside so a partial one is never seen
+        staging = tempfile.mkdtemp(prefix=".staging-", dir=self.directory)
+        try:
+            for name, filepath in outputs.items():
+                shutil.copyfile(filepath, os.path.join(staging, name))
+            if os.path.isdir(entry):
+                shutil.rmtree(entry)
+            os.replace(staging, entry)
+        except Exception:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+
+        self.evict(keep=key)
+
+    def entries(self):
+        """(last use, size, key) of every entry"""
+        if not os.path.isdir(self.directory):
+            return []
+
+        result = []
+        for key in os.listdir(self.directory):
+            entry = self.entry_path(key)
+            if key.startswith(".") or not os.path.isdir(entry):
+                continue
+            size = sum(os.path.getsize(os.path.join(entry, name)) for name in os.listdir(entry))
+            result.append((os.path.getmtime(entry), size, key))
+        return result
+
+    def evict(self, keep=None):
+        entries = sorted(self.entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, key in entries:
+            if total <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+            shutil.rmtree(self.entry_path(key), ignore_errors=True)
+            total -= size
+
+    def clear(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
@@ -7,80 +7,31 @@
 #
 # ##### END LICENSE BLOCK #####
 
-import bpy, bmesh
+import bpy
 import time
 
 import io_mesh_bnd.common_helpers as helper
+import io_mesh_bnd.bound_io as bound_io
+import io_mesh_bnd.instrumentation as instrumentation
 
 ######################################################
 # IMPORT MAIN FILES
 ######################################################
-def read_bnd_file(file):
-    scn = bpy.context.scene
-    # add a mesh and link it to the scene
-    me = bpy.data.meshes.new('BoundMesh')
-    ob = bpy.data.objects.new('BOUND', me)
+def read_bnd_file(filepath, reuse_materials):
+    report = instrumentation.current()
 
-    bm = bmesh.new()
-    bm.from_mesh(me)
-    
-    scn.collection.objects.link(ob)
-    bpy.context.view_layer.objects.active = ob
-    
-    bpy.ops.object.mode_set(mode='EDIT', toggle=False)
-    
-    # read in BND file!
-    for raw_line in file.readlines():
-      # get line components
-      cmps = raw_line.lower().split()
-      
-      # empty line?
-      if len(cmps) < 2:
-        continue
-      
-      # not an empty line, read it!
-      if cmps[0] == "v":
-        # vertex
-        bm.verts.new((float(cmps[1]) * -1, float(cmps[3]), float(cmps[2])))
-        bm.verts.ensure_lookup_table()
-      elif cmps[0] == "mtl":
-        # material
-        ob.data.materials.append(helper.create_material(cmps[1]))
-      elif cmps[0] == "quad" or cmps[0] == "tri":
-        face = None
-        num_indices = 4 if cmps[0] == "quad" else 3
-        
-        # create face
-        if num_indices == 4:
-          try:
-            face = bm.faces.new((bm.verts[int(cmps[1])], bm.verts[int(cmps[2])], bm.verts[int(cmps[3])], bm.verts[int(cmps[4])]))
-          except Exception as e:
-            print(str(e))
-        if num_indices == 3:
-          try:
-            face = bm.faces.new((bm.verts[int(cmps[1])], bm.verts[int(cmps[2])], bm.verts[int(cmps[3])]))
-          except Exception as e:
-            print(str(e))
-        
-        # set smooth/material
-        if face is not None:
-          face.material_index = int(cmps[num_indices+1])
-          face.smooth = True
-    
-    # calculate normals
-    bm.normal_update()
-    
-    # free resources
-    bpy.ops.object.mode_set(mode='OBJECT', toggle=False)
-    bm.to_mesh(me)
-    bm.free()
+    # repeat imports of an unchanged file skip parsing
+    bound = report.run("parse", bound_io.bound_cache.read, filepath)
+    report.run("build_mesh", helper.create_bound_object, bound, reuse_materials)
       
 
 ######################################################
 # IMPORT
 ######################################################
 def load_bnd(filepath,
-             context):
+             context,
+             reuse_materials):
+    """Import a BND file, returns the instrumentation report"""
 
     print("importing BND: %r..." % (filepath))
 
@@ -88,22 +39,34 @@ def load_bnd(filepath,
         bpy.ops.object.select_all(action='DESELECT')
 
     time1 = time.perf_counter()
-    file = open(filepath, 'r')
 
     # start reading our bnd file
-    read_bnd_file(file)
+    with instrumentation.start("import_bnd") as report:
+        read_bnd_file(filepath, reuse_materials)
 
+    report.print_stages()
     print(" done in %.4f sec." % (time.perf_counter() - time1))
-    file.close()
+    return report
 
 
 def load(operator,
          context,
          filepath="",
+         files=None,
+         directory="",
+         whole_directory=False,
+         reuse_materials=True,
          ):
 
-    load_bnd(filepath,
-             context,
-             )
+    filepaths = helper.selected_filepaths(filepath, files, directory, ".bnd", whole_directory)
+    if len(filepaths) == 1:
+        load_bnd(filepaths[0],
+                 context,
+                 reuse_materials,
+                 )
+    elif len(filepaths) > 1:
+        if bpy.ops.object.select_all.poll():
+            bpy.ops.object.select_all(action='DESELECT')
+        helper.load_bounds(filepaths, reuse_materials)
 
     return {'FINISHED'}
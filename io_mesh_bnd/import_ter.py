@@ -0,0 +1,159 @@
+# ##### BEGIN LICENSE BLOCK #####
+#
+# This program is licensed under Creative Commons BY-NC-SA:
+# https://creativecommons.org/licenses/by-nc-sa/3.0/
+#
+# Created by Dummiesman, 2016-2020
+#
+# ##### END LICENSE BLOCK #####
+
+import bpy
+import time, json
+import numpy as np
+
+import io_mesh_bnd.bound_io as bound_io
+import io_mesh_bnd.instrumentation as instrumentation
+
+######################################################
+# IMPORT HELPERS
+######################################################
+def grid_faces(width_sections, depth_sections):
+    """Quad vertex indices of every section, in file order (depth major,
+    width reversed), over a (width + 1) x (depth + 1) vertex grid"""
+    sections = np.arange(width_sections * depth_sections)
+    d = sections // width_sections
+    w = (width_sections - 1) - (sections % width_sections)
+    corner = (d * (width_sections + 1)) + w
+    return np.stack((corner, corner + 1, corner + width_sections + 2, corner + width_sections + 1), axis=1)
+
+
+def density_colors(section_sizes):
+    # blue for empty sections through to red for the fullest one
+    density = section_sizes / max(int(section_sizes.max()), 1) if len(section_sizes) > 0 else section_sizes
+    colors = np.ones((len(section_sizes), 4), dtype=np.float32)
+    colors[:, 0] = density
+    colors[:, 1] = 0.2
+    colors[:, 2] = 1 - density
+    return colors
+
+
+######################################################
+# IMPORT MAIN FILES
+######################################################
+def create_ter_overlay(terrain, name):
+    """One mesh with a face per section, each carrying its face count in
+    the 'ter_faces' attribute and a density color in 'ter_density'"""
+    if terrain.height_sections != 1:
+        raise Exception('Only TER files with one height section are supported.')
+
+    width_sections = terrain.width_sections
+    depth_sections = terrain.depth_sections
+    bnds_min = terrain.bnds_min
+    bnds_max = terrain.bnds_max
+
+    xs = np.linspace(bnds_min[0], bnds_max[0], width_sections + 1)
+    ys = np.linspace(bnds_min[1], bnds_max[1], depth_sections + 1)
+    vertices = np.zeros(((depth_sections + 1) * (width_sections + 1), 3), dtype=np.float32)
+    vertices[:, 0] = np.tile(xs, depth_sections + 1)
+    vertices[:, 1] = np.repeat(ys, width_sections + 1)
+    vertices[:, 2] = bnds_max[2]
+
+    faces = grid_faces(width_sections, depth_sections)
+    num_faces = len(faces)
+
+    me = bpy.data.meshes.new(name)
+    ob = bpy.data.objects.new(name, me)
+
+    me.vertices.add(len(vertices))
+    me.vertices.foreach_set("co", vertices.ravel())
+
+    me.loops.add(num_faces * 4)
+    me.loops.foreach_set("vertex_index", faces.ravel().astype(np.int32))
+
+    me.polygons.add(num_faces)
+    me.polygons.foreach_set("loop_start", np.arange(0, num_faces * 4, 4, dtype=np.int32))
+    if bpy.app.version < (4, 0, 0):
+      me.polygons.foreach_set("loop_total", np.full(num_faces, 4, dtype=np.int32))
+
+    me.update(calc_edges=True)
+
+    # generic attributes came in 2.91, their face domain was 'POLYGON' until 3.0
+    if hasattr(me, "attributes"):
+      face_domain = 'FACE' if bpy.app.version >= (3, 0, 0) else 'POLYGON'
+      face_counts = me.attributes.new("ter_faces", 'INT', face_domain)
+      face_counts.data.foreach_set("value", terrain.section_sizes.astype(np.int32))
+      density = me.attributes.new("ter_density", 'FLOAT_COLOR', face_domain)
+      density.data.foreach_set("color", density_colors(terrain.section_sizes).ravel())
+
+    ob.show_wire = True
+    bpy.context.scene.collection.objects.link(ob)
+    bpy.context.view_layer.objects.active = ob
+    return ob
+
+
+def show_ter_report(context, quality, title):
+    lines = bound_io.format_ter_quality(quality)
+
+    def draw(self, context):
+        for line in lines:
+            self.layout.label(text=line, icon='ERROR' if line.startswith("WARNING") else 'NONE')
+
+    context.window_manager.popup_menu(draw, title=title, icon='INFO')
+
+
+######################################################
+# IMPORT
+######################################################
+def load_ter(filepath,
+             context,
+             show_report=False,
+             write_report=False):
+    """Import a TER file, returns the instrumentation report. The section
+    quality report can be shown in a popup, and written next to the file
+    as JSON."""
+
+    print("importing TER: %r..." % (filepath))
+
+    if bpy.ops.object.select_all.poll():
+        bpy.ops.object.select_all(action='DESELECT')
+
+    time1 = time.perf_counter()
+
+    # start reading our ter file
+    with instrumentation.start("import_ter") as report:
+        terrain = report.run("parse", bound_io.read_ter, filepath)
+        report.run("build_mesh", create_ter_overlay, terrain, "TER")
+        report.count("sections", terrain.num_sections)
+
+    report.print_stages()
+    print(" %d x %d sections, %d poly indices, at most %d in a section" % (terrain.width_sections, terrain.depth_sections, len(terrain.section_faces),
+                                                                          int(terrain.section_sizes.max()) if terrain.num_sections > 0 else 0))
+
+    if show_report or write_report:
+        quality = bound_io.ter_quality(terrain)
+        for line in bound_io.format_ter_quality(quality):
+            print(" " + line)
+        if write_report:
+            with open(filepath + ".json", 'w') as file:
+                json.dump(quality, file, indent=2)
+        if show_report:
+            show_ter_report(context, quality, bpy.path.basename(filepath))
+
+    print(" done in %.4f sec." % (time.perf_counter() - time1))
+    return report
+
+
+def load(operator,
+         context,
+         filepath="",
+         show_report=False,
+         write_report=False,
+         ):
+
+    load_ter(filepath,
+             context,
+             show_report,
+             write_report,
+             )
+
+    return {'FINISHED'}
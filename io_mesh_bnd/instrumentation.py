@@ -0,0 +1,197 @@
+# ##### BEGIN LICENSE BLOCK #####
+#
+# This program is licensed under Creative Commons BY-NC-SA:
+# https://creativecommons.org/licenses/by-nc-sa/3.0/
+#
+# Created by Dummiesman, 2016-2020
+#
+# ##### END LICENSE BLOCK #####
+
+# Stage timings and counters for imports and exports, off unless asked
+# for. Code being measured asks for the current report of its thread, which
+# is a no-op one unless a report was started, so leaving the hooks in costs
+# next to nothing.
+#
+#   BND_PROFILE=1           turn reports on, or configure(enable=True)
+#   BND_PROFILE_MEMORY=1    also record the peak traced memory of each stage
+#   BND_PROFILE_JSON=path   append every report to path as a line of JSON
+
+import os, time, json, threading, tracemalloc
+
+# settings, see configure()
+enabled = os.environ.get("BND_PROFILE", "0") == "1"
+trace_memory = os.environ.get("BND_PROFILE_MEMORY", "0") == "1"
+json_path = os.environ.get("BND_PROFILE_JSON") or None
+
+
+def configure(enable=None, memory=None, json_file=None):
+    global enabled, trace_memory, json_path
+    if enable is not None:
+        enabled = enable
+    if memory is not None:
+        trace_memory = memory
+    if json_file is not None:
+        json_path = json_file or None
+
+
+######################################################
+# REPORTS
+######################################################
+class Stage:
+    __slots__ = ("report", "name", "time1", "record")
+
+    def __init__(self, report, name):
+        self.report = report
+        self.name = name
+
+    def __enter__(self):
+        report = self.report
+        report.path.append(self.name)
+        if report.trace_memory and len(report.path) == 1:
+            tracemalloc.clear_traces()
+
+        # listed in the order they start, so nested stages follow their parent
+        self.record = {"stage": "/".join(report.path), "depth": len(report.path) - 1, "seconds": None}
+        report.stages.append(self.record)
+        self.time1 = time.perf_counter()
+        return self
+
+    def __exit__(self, *args):
+        report = self.report
+        self.record["seconds"] = time.perf_counter() - self.time1
+        if report.trace_memory and len(report.path) == 1:
+            self.record["peak_mib"] = tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+        report.path.pop()
+
+
+class Report:
+    """Timings of the stages run while it's active, in the order they
+    started, and named counters. Stages nest, their names are joined with
+    '/'. Use start() to get one."""
+
+    def __init__(self, name, trace_memory=False, json_path=None):
+        self.name = name
+        self.trace_memory = trace_memory
+        self.json_path = json_path
+        self.stages = []
+        self.counters = {}
+        self.path = []
+        self.seconds = 0.0
+        self.merged_seconds = 0.0
+        self.started_tracing = False
+        self.previous = None
+
+    def stage(self, name):
+        return Stage(self, name)
+
+    def count(self, name, value=1):
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def run(self, name, func, *args):
+        with self.stage(name):
+            return func(*args)
+
+    def merge(self, other):
+        """Take the stages, counters and time of a finished report, e.g.
+        one recorded on another thread"""
+        self.stages.extend(other.stages)
+        for name, value in other.counters.items():
+            self.count(name, value)
+        self.merged_seconds += other.seconds
+
+    def __enter__(self):
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self.started_tracing = True
+        self.previous = current()
+        _local.report = self
+        self.time1 = time.perf_counter()
+        return self
+
+    def __exit__(self, *args):
+        self.seconds = (time.perf_counter() - self.time1) + self.merged_seconds
+        _local.report = self.previous
+        if self.started_tracing:
+            tracemalloc.stop()
+            self.started_tracing = False
+        if self.json_path is not None:
+            self.write_json(self.json_path)
+
+    def as_dict(self):
+        return {"name": self.name, "seconds": self.seconds, "stages": list(self.stages), "counters": dict(self.counters)}
+
+    def write_json(self, path):
+        with _json_lock, open(path, 'a') as file:
+            file.write(json.dumps(self.as_dict()) + "\n")
+
+    def print_stages(self):
+        for record in self.stages:
+            peak = ", peak %.2f MiB" % record["peak_mib"] if "peak_mib" in record else ""
+            print(" %s%s: %.4f sec.%s" % ("  " * record["depth"], record["stage"].rsplit("/", 1)[-1], record["seconds"], peak))
+        if len(self.counters) > 0:
+            print(" " + ", ".join("%s: %d" % (name, value) for name, value in self.counters.items()))
+
+
+class NullStage:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+
+class NullReport:
+    """Stands in for a Report when instrumentation is off"""
+    name = None
+    stages = ()
+    counters = {}
+    seconds = 0.0
+
+    def stage(self, name):
+        return NULL_STAGE
+
+    def count(self, name, value=1):
+        pass
+
+    def run(self, name, func, *args):
+        return func(*args)
+
+    def merge(self, other):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+    def as_dict(self):
+        return None
+
+    def print_stages(self):
+        pass
+
+
+NULL_STAGE = NullStage()
+NULL_REPORT = NullReport()
+
+# active report of each thread
+_local = threading.local()
+_json_lock = threading.Lock()
+
+
+def start(name, sink=True):
+    """A new report to use as a context manager, or the no-op report when
+    instrumentation is off. Without sink it's never written to the JSON
+    file, for parts merged into another report."""
+    if not enabled:
+        return NULL_REPORT
+    return Report(name, trace_memory, json_path if sink else None)
+
+
+def current():
+    """The active report of this thread, stages and counts on it are
+    dropped if none is"""
+    return getattr(_local, "report", NULL_REPORT)
@@ -0,0 +1,48 @@
+# ##### BEGIN LICENSE BLOCK #####
+#
+# This program is licensed under Creative Commons BY-NC-SA:
+# https://creativecommons.org/licenses/by-nc-sa/3.0/
+#
+# Created by Dummiesman, 2016-2020
+#
+# ##### END LICENSE BLOCK #####
+
+import numpy as np
+
+class MeshBuffers:
+    """Flat copies of the mesh data the exporters need, read in bulk with
+    foreach_get. Face i owns loops face_starts[i] .. face_starts[i] + face_sizes[i]."""
+
+    def __init__(self, mesh):
+        num_verts = len(mesh.vertices)
+        num_edges = len(mesh.edges)
+        num_loops = len(mesh.loops)
+        num_faces = len(mesh.polygons)
+
+        self.vertices = np.empty(num_verts * 3, dtype=np.float32)
+        mesh.vertices.foreach_get("co", self.vertices)
+        self.vertices.shape = (num_verts, 3)
+
+        self.edge_vertices = np.empty(num_edges * 2, dtype=np.int32)
+        mesh.edges.foreach_get("vertices", self.edge_vertices)
+        self.edge_vertices.shape = (num_edges, 2)
+
+        self.loop_vertices = np.empty(num_loops, dtype=np.int32)
+        mesh.loops.foreach_get("vertex_index", self.loop_vertices)
+        self.loop_edges = np.empty(num_loops, dtype=np.int32)
+        mesh.loops.foreach_get("edge_index", self.loop_edges)
+
+        self.face_starts = np.empty(num_faces, dtype=np.int32)
+        mesh.polygons.foreach_get("loop_start", self.face_starts)
+        self.face_sizes = np.empty(num_faces, dtype=np.int32)
+        mesh.polygons.foreach_get("loop_total", self.face_sizes)
+        self.material_indices = np.empty(num_faces, dtype=np.int32)
+        mesh.polygons.foreach_get("material_index", self.material_indices)
+
+    @property
+    def num_vertices(self):
+        return len(self.vertices)
+
+    @property
+    def num_faces(self):
+        return len(self.face_starts)
@@ -0,0 +1,325 @@
+# ##### BEGIN LICENSE BLOCK #####
+#
+# This program is licensed under Creative Commons BY-NC-SA:
+# https://creativecommons.org/licenses/by-nc-sa/3.0/
+#
+# Created by Dummiesman, 2016-2020
+#
+# ##### END LICENSE BLOCK #####
+
+import bpy
+import textwrap 
+
+from bpy.props import (
+        BoolProperty,
+        EnumProperty,
+        FloatProperty,
+        StringProperty,
+        CollectionProperty,
+        )
+from bpy_extras.io_utils import (
+        ImportHelper,
+        ExportHelper,
+        )
+
+class ImportBND(bpy.types.Operator, ImportHelper):
+    """Import from BND file format (.bnd)"""
+    bl_idname = "import_scene.bnd"
+    bl_label = 'Import Bound'
+    bl_options = {'UNDO'}
+
+    filename_ext = ".bnd"
+    filter_glob: StringProperty(default="*.bnd", options={'HIDDEN'})
+
+    files: CollectionProperty(type=bpy.types.OperatorFileListElement, options={'HIDDEN', 'SKIP_SAVE'})
+    directory: StringProperty(subtype='DIR_PATH', options={'HIDDEN', 'SKIP_SAVE'})
+
+    whole_directory: BoolProperty(
+        name="Whole Directory",
+        description="Import every bound in the folder of the selected file, into one collection",
+        default=False,
+        )
+
+    reuse_materials: BoolProperty(
+        name="Reuse Materials",
+        description="Share one material per surface type across imports, instead of creating new ones for every bound",
+        default=True,
+        )
+
+    def execute(self, context):
+        from . import import_bnd
+        keywords = self.as_keywords(ignore=("axis_forward",
+                                            "axis_up",
+                                            "filter_glob",
+                                            "check_existing",
+                                            ))
+
+        return import_bnd.load(self, context, **keywords)
+
+
+class ImportBBND(bpy.types.Operator, ImportHelper):
+    """Import from BBND file format (.bbnd)"""
+    bl_idname = "import_scene.bbnd"
+    bl_label = 'Import Binary Bound'
+    bl_options = {'UNDO'}
+
+    filename_ext = ".bbnd"
+    filter_glob: StringProperty(default="*.bbnd", options={'HIDDEN'})
+
+    files: CollectionProperty(type=bpy.types.OperatorFileListElement, options={'HIDDEN', 'SKIP_SAVE'})
+    directory: StringProperty(subtype='DIR_PATH', options={'HIDDEN', 'SKIP_SAVE'})
+
+    whole_directory: BoolProperty(
+        name="Whole Directory",
+        description="Import every bound in the folder of the selected file, into one collection",
+        default=False,
+        )
+
+    bound_repair_debug: BoolProperty(
+        name="Make Empty At First Vertex",
+        description="Places an empty object at the first vertex, in order to help repair broken bounds.",
+        default=False,
+        )
+
+    reuse_materials: BoolProperty(
+        name="Reuse Materials",
+        description="Share one material per surface type across imports, instead of creating new ones for every bound",
+        default=True,
+        )
+        
+    def draw(self, context):
+        layout = self.layout
+        
+        wrapp = textwrap.TextWrapper(width=42)
+        wList = wrapp.wrap(text=("In the previous versions of this addon, BBND files were exported in a way which could cause quads connected to the first vertex to turn into triangles instead. "
+                                 "Use this option to place an empty object at the first vertex, so you can easily locate and fix this issue if it occurred.")) 
+        for text in wList: 
+            row = layout.row(align = True)
+            row.alignment = 'EXPAND'
+            row.label(text=text)
+            
+        sub = layout.row()
+        sub.prop(self, "whole_directory")
+        sub = layout.row()
+        sub.prop(self, "bound_repair_debug")
+        sub = layout.row()
+        sub.prop(self, "reuse_materials")
+
+        
+    def execute(self, context):
+        from . import import_bbnd
+        keywords = self.as_keywords(ignore=("axis_forward",
+                                            "axis_up",
+                                            "filter_glob",
+                                            "check_existing",
+                                            ))
+
+        return import_bbnd.load(self, context, **keywords)
+
+
+class ImportTER(bpy.types.Operator, ImportHelper):
+    """Import the section grid of a TER file (.ter) as an overlay mesh"""
+    bl_idname = "import_scene.ter"
+    bl_label = 'Import Terrain Bound'
+    bl_options = {'UNDO'}
+
+    filename_ext = ".ter"
+    filter_glob: StringProperty(default="*.ter", options={'HIDDEN'})
+
+    show_report: BoolProperty(
+        name="Show Quality Report",
+        description="Show faces per section, query cost and size statistics of the terrain bound after importing it",
+        default=False,
+        )
+
+    write_report: BoolProperty(
+        name="Write Quality Report",
+        description="Write the statistics next to the file as .ter.json",
+        default=False,
+        )
+
+    def execute(self, context):
+        from . import import_ter
+        keywords = self.as_keywords(ignore=("axis_forward",
+                                            "axis_up",
+                                            "filter_glob",
+                                            "check_existing",
+                                            ))
+
+        return import_ter.load(self, context, **keywords)
+
+
+class ExportBND(bpy.types.Operator, ExportHelper):
+    """Export to BND file format (.BND)"""
+    bl_idname = "export_scene.bnd"
+    bl_label = 'Export BND'
+
+    filename_ext = ".bnd"
+    filter_glob: StringProperty(
+            default="*.bnd",
+            options={'HIDDEN'},
+            )
+
+    export_binary: BoolProperty(
+        name="Export Binary Bound",
+        description="Export a binary bound along the ASCII bound",
+        default=False,
+        )
+        
+    export_terrain: BoolProperty(
+        name="Export Terrain Bound",
+        description="Export a terrain bound along the binary bound",
+        default=False,
+        )
+
+    incremental_terrain: BoolProperty(
+        name="Incremental Terrain Bound",
+        description="Keep terrain bound sections in a .ter.cache file next to the export, and only sort faces that moved since the last export",
+        default=False,
+        )
+
+    auto_terrain_grid: BoolProperty(
+        name="Tune Terrain Grid",
+        description="Try several terrain bound section sizes and keep the one with the fewest faces per collision lookup for its table size, instead of 10m sections",
+        default=False,
+        )
+
+    use_export_cache: BoolProperty(
+        name="Use Export Cache",
+        description="Reuse the files from a previous export when the BOUND and these options haven't changed",
+        default=False,
+        )
+
+    apply_modifiers: BoolProperty(
+        name="Apply Modifiers",
+        description="Do you desire modifiers to be applied in the PKG?",
+        default=True,
+        )
+
+    background: BoolProperty(
+        name="Export in Background",
+        description="Keep working while the files are written, progress shows in the status bar and Esc cancels",
+        default=False,
+        )
+
+    _job = None
+    _timer = None
+        
+    def draw(self, context):
+        layout = self.layout
+        sub = layout.row()
+        sub.prop(self, "export_binary")
+        sub = layout.row()
+        sub.enabled = self.export_binary
+        sub.prop(self, "export_terrain")
+        sub = layout.row()
+        sub.enabled = self.export_binary and self.export_terrain
+        sub.prop(self, "incremental_terrain")
+        sub = layout.row()
+        sub.enabled = self.export_binary and self.export_terrain
+        sub.prop(self, "auto_terrain_grid")
+        sub = layout.row()
+        sub.prop(self, "apply_modifiers")
+        sub = layout.row()
+        sub.prop(self, "use_export_cache")
+        sub = layout.row()
+        sub.prop(self, "background")
+        
+    def execute(self, context):
+        from . import export_bnd
+        
+        keywords = self.as_keywords(ignore=("axis_forward",
+                                            "axis_up",
+                                            "filter_glob",
+                                            "check_existing",
+                                            "background",
+                                            ))
+
+        if not self.background:
+            return export_bnd.save(self, context, **keywords)
+
+        # the BOUND is read now, files are written on a worker thread
+        self._job = export_bnd.save_background(self, context, **keywords)
+
+        wm = context.window_manager
+        self._timer = wm.event_timer_add(0.1, window=context.window)
+        wm.progress_begin(0, 100)
+        wm.modal_handler_add(self)
+        return {'RUNNING_MODAL'}
+
+    def modal(self, context, event):
+        job = self._job
+        if event.type == 'ESC' and event.value == 'PRESS':
+            job.cancel()
+            return {'RUNNING_MODAL'}
+
+        if event.type != 'TIMER':
+            return {'PASS_THROUGH'}
+
+        context.window_manager.progress_update(int(job.progress * 100))
+        context.workspace.status_text_set("Exporting BOUND, %d%% (Esc to cancel)" % (job.progress * 100))
+        if not job.done:
+            return {'PASS_THROUGH'}
+
+        self.finish(context)
+        if job.cancelled:
+            self.report({'WARNING'}, "BOUND export cancelled")
+            return {'CANCELLED'}
+        if job.error is not None:
+            self.report({'ERROR'}, "BOUND export failed: %s" % job.error)
+            return {'CANCELLED'}
+        return {'FINISHED'}
+
+    def cancel(self, context):
+        # Blender is closing the operator, e.g. the file is being reloaded
+        self._job.cancel()
+        self._job.thread.join()
+        self.finish(context)
+
+    def finish(self, context):
+        wm = context.window_manager
+        wm.event_timer_remove(self._timer)
+        wm.progress_end()
+        context.workspace.status_text_set(None)
+
+
+# Add to a menu
+def menu_func_export(self, context):
+    self.layout.operator(ExportBND.bl_idname, text="Angel Studios Bound (.bnd)")
+
+def menu_func_import_bnd(self, context):
+    self.layout.operator(ImportBND.bl_idname, text="Angel Studios Bound (.bnd)")
+    
+def menu_func_import_bbnd(self, context):
+    self.layout.operator(ImportBBND.bl_idname, text="Angel Studios Binary Bound (.bbnd)")
+
+def menu_func_import_ter(self, context):
+    self.layout.operator(ImportTER.bl_idname, text="Angel Studios Terrain Bound (.ter)")
+
+
+# Register factories
+classes = (
+    ImportBND,
+    ImportBBND,
+    ImportTER,
+    ExportBND
+)
+
+def register():
+    for cls in classes:
+        bpy.utils.register_class(cls)
+
+    bpy.types.TOPBAR_MT_file_import.append(menu_func_import_bnd)
+    bpy.types.TOPBAR_MT_file_import.append(menu_func_import_bbnd)
+    bpy.types.TOPBAR_MT_file_import.append(menu_func_import_ter)
+    bpy.types.TOPBAR_MT_file_export.append(menu_func_export)
+
+
+def unregister():
+    bpy.types.TOPBAR_MT_file_import.remove(menu_func_import_bnd)
+    bpy.types.TOPBAR_MT_file_import.remove(menu_func_import_bbnd)
+    bpy.types.TOPBAR_MT_file_import.remove(menu_func_import_ter)
+    bpy.types.TOPBAR_MT_file_export.remove(menu_func_export)
+    
+    for cls in reversed(classes):
+        bpy.utils.unregister_class(cls)
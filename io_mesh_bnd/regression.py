@@ -0,0 +1,246 @@
+# ##### BEGIN LICENSE BLOCK #####
+#
+# This program is licensed under Creative Commons BY-NC-SA:
+# https://creativecommons.org/licenses/by-nc-sa/3.0/
+#
+# Created by Dummiesman, 2016-2020
+#
+# ##### END LICENSE BLOCK #####
+
+# Writes fixed bounds as BND, BBND and TER, compares the files against
+# golden bytes and reads every one back. Runs without Blender, exits with
+# 1 if anything changed.
+#
+#   python -m io_mesh_bnd.regression
+#   python -m io_mesh_bnd.regression --print-golden    after a deliberate format change
+
+import os, sys, argparse, hashlib, tempfile
+import numpy as np
+
+import io_mesh_bnd.bound_io as bound_io
+import io_mesh_bnd.benchmark as benchmark
+
+# synthetic bounds checked by hash, see benchmark.make_synthetic
+SYNTHETIC_CASES = (("grid", 2000), ("city", 2000), ("terrain", 2000))
+
+FORMATS = ("bnd", "bbnd", "ter")
+
+######################################################
+# GOLDEN DATA
+######################################################
+# the small bound, byte for byte
+GOLDEN_SMALL = {
+    "small.bnd": ("76657273696f6e3a20312e30310a76657274733a20390a6d6174657269616c73"
+        "3a20320a65646765733a20300a706f6c79733a20350a0a76202d302e30303030"
+        "303020302e30303030303020302e3030303030300a76202d31322e3030303030"
+        "3020312e30303030303020302e3030303030300a76202d32352e303030303030"
+        "20302e35303030303020302e3030303030300a76202d302e3030303030302032"
+        "2e3030303030302031322e3030303030300a76202d31322e3030303030302033"
+        "2e3030303030302031322e3030303030300a76202d32352e3030303030302031"
+        "2e3530303030302031322e3030303030300a76202d302e30303030303020302e"
+        "3030303030302032352e3030303030300a76202d31322e30303030303020312e"
+        "3030303030302032352e3030303030300a76202d32352e30303030303020342e"
+        "3030303030302032352e3030303030300a0a6d746c206772617373207b0a0965"
+        "6c61737469636974793a20302e3130303030300a096672696374696f6e3a2030"
+        "2e3530303030300a096566666563743a206e6f6e650a09736f756e643a206e6f"
+        "6e650a7d0a6d746c20776f6f64207b0a09656c61737469636974793a20302e31"
+        "30303030300a096672696374696f6e3a20302e3530303030300a096566666563"
+        "743a206e6f6e650a09736f756e643a206e6f6e650a7d0a0a7175616420312020"
+        "342020332020302020300a7175616420312020322020352020342020310a7175"
+        "616420332020342020372020362020300a74726920342020352020382020310a"
+        "74726920342020382020372020310a"),
+    "small.bbnd": ("01090000000200000005000000000000800000000000000000000040c1000080"
+        "3f000000000000c8c10000003f00000000000000800000004000004041000040"
+        "c100004040000040410000c8c10000c03f0000404100000080000000000000c8"
+        "41000040c10000803f0000c8410000c8c1000080400000c84167726173730000"
+        "00000000000000000000000000000000000000000000000000cdcccc3d000000"
+        "3f6e6f6e65000000000000000000000000000000000000000000000000000000"
+        "006e6f6e65000000000000000000000000000000000000000000000000000000"
+        "00776f6f64000000000000000000000000000000000000000000000000000000"
+        "00cdcccc3d0000003f6e6f6e6500000000000000000000000000000000000000"
+        "0000000000000000006e6f6e6500000000000000000000000000000000000000"
+        "0000000000000000000000010004000300000001000200050004000100030004"
+        "000700060000000400050008000000010004000800070000000100"),
+    "small.ter": ("cdcc8c3f0500000000000000000000c841000080400000c84103000000010000"
+        "000300000009000000140000008fc2f53d0000803f8fc2f53d0000c8c1000000"
+        "000000000000000080000080400000c841000001000300040007000c000e0010"
+        "0013000100020001000300050002000200030001000100000001000000010003"
+        "0004000000010002000300040000000200030004000200030004000200"),
+}
+
+# sha256 of every output
+GOLDEN_SHA256 = {
+    "small.bnd": "c0b19c8017f89b72bb394bb2d4224fac2d8f70ba3631c03786d596c4f94e4358",
+    "small.bbnd": "c28b5d69d499d409f49d1c9687332000d4c29104af84c50f2ce69982abc3c552",
+    "small.ter": "6295c9bd6d785f3207d1882e931fc74d68276d06173b22180d2475381a707381",
+    "grid_2000.bnd": "43d83e625d2abf9ce92ecd9b17ae342d166b0ce2fd72f19017e6a149cebb943e",
+    "grid_2000.bbnd": "07c3f7fa582fe043a6f6b05863f0ccd24056425a436545df100cdae86b0e15f0",
+    "grid_2000.ter": "104ca601f5b5ce68067a48a79c48c08cc93f0f4445f570e367220eda55c6c915",
+    "city_2000.bnd": "699f3dba52e7e10a660969529d505f83f74cd965cd5116bbee118ba84329300a",
+    "city_2000.bbnd": "42946d03d87d990fd59c1ebfe4cc4a3bb2ffd12130ea58cd5736c28ed1679670",
+    "city_2000.ter": "ef6774f31828d884729aae0b348323e6ed17f354f482ec8d683e88c93be040e7",
+    "terrain_2000.bnd": "8667f0f25dd486e552f25c8192cd85ac158bae7cd55d9d83b71ebf943aacf3a5",
+    "terrain_2000.bbnd": "9aef3d4288b82a02d4a4c4214d4228929141191fdebd6619c0cbe7de7ff9e822",
+    "terrain_2000.ter": "71b959542d4d1f2830eb8deb7dcb517b961b373b35042bd7b82c214838171690",
+}
+
+######################################################
+# BOUNDS
+######################################################
+def make_small():
+    """Three quads and two triangles over a 3 x 3 section grid, with a quad
+    whose last index is 0 so the BBND writer rotates it"""
+    vertices = [(0, 0, 0), (12, 0, 1), (25, 0, 0.5),
+                (0, 12, 2), (12, 12, 3), (25, 12, 1.5),
+                (0, 25, 0), (12, 25, 1), (25, 25, 4)]
+    loop_vertices = [1, 4, 3, 0,
+                     1, 2, 5, 4,
+                     3, 4, 7, 6,
+                     4, 5, 8,
+                     4, 8, 7]
+    face_sizes = [4, 4, 4, 3, 3]
+    material_indices = [0, 1, 0, 1, 1]
+    return bound_io.Bound(np.array(vertices, dtype=np.float32), loop_vertices, face_sizes, material_indices, ["grass", "wood"])
+
+
+def cases():
+    yield "small", make_small()
+    for generator, num_faces in SYNTHETIC_CASES:
+        yield "%s_%d" % (generator, num_faces), benchmark.make_synthetic(generator, num_faces)
+
+
+######################################################
+# CHECKS
+######################################################
+def write_file(path, kind, bound):
+    if kind == "bnd":
+        with open(path, 'w', newline='\n') as file:
+            bound_io.write_bnd(file, bound)
+    elif kind == "bbnd":
+        with open(path, 'wb') as file:
+            bound_io.write_bbnd(file, bound)
+    else:
+        with open(path, 'wb') as file:
+            bound_io.write_ter(file, bound_io.make_terrain_bound(bound))
+
+
+def read_file(path, kind):
+    if kind == "bnd":
+        with open(path, 'r') as file:
+            return bound_io.read_bnd(file)
+    elif kind == "bbnd":
+        return bound_io.read_bbnd(path)
+    return bound_io.read_ter(path)
+
+
+def rewrite_file(path, kind, item):
+    # the same writers, fed with what was read back
+    if kind == "ter":
+        with open(path, 'wb') as file:
+            bound_io.write_ter(file, item)
+    else:
+        write_file(path, kind, item)
+
+
+def first_difference(data, golden):
+    size = min(len(data), len(golden))
+    differs = np.flatnonzero(np.frombuffer(data[:size], np.uint8) != np.frombuffer(golden[:size], np.uint8))
+    return int(differs[0]) if len(differs) > 0 else size
+
+
+def check_read(kind, bound, item):
+    """What read back against what was written, returns an error or None"""
+    if kind == "ter":
+        terrain = bound_io.make_terrain_bound(bound)
+        if item.num_faces != terrain.num_faces or item.num_sections != terrain.num_sections:
+            return "grid or face count differs"
+        if not (np.array_equal(item.section_sizes, terrain.section_sizes) and np.array_equal(item.section_faces, terrain.section_faces)):
+            return "section groups differ"
+        return None
+
+    if item.num_faces != bound.num_faces or item.num_vertices != bound.num_vertices:
+        return "vertex or face count differs"
+    if list(item.material_names) != list(bound.material_names):
+        return "material names differ"
+    if not np.array_equal(item.material_indices, bound.material_indices):
+        return "material indices differ"
+    # the ASCII format keeps 6 decimals
+    if not np.allclose(item.vertices, bound.vertices, atol=1e-5 if kind == "bnd" else 0):
+        return "vertices differ"
+    return None
+
+
+def run(directory, verbose=True):
+    """Returns (name, error) for every check that failed"""
+    failures = []
+    outputs = {}
+    for name, bound in cases():
+        for kind in FORMATS:
+            key = "%s.%s" % (name, kind)
+            path = os.path.join(directory, key)
+            try:
+                write_file(path, kind, bound)
+                with open(path, 'rb') as file:
+                    data = file.read()
+                outputs[key] = data
+
+                errors = []
+                golden = GOLDEN_SMALL.get(key)
+                if golden is not None and data != bytes.fromhex(golden):
+                    errors.append("differs from the golden bytes at offset %d" % first_difference(data, bytes.fromhex(golden)))
+                if hashlib.sha256(data).hexdigest() != GOLDEN_SHA256.get(key):
+                    errors.append("sha256 differs from the golden file")
+
+                item = read_file(path, kind)
+                error = check_read(kind, bound, item)
+                if error is not None:
+                    errors.append("read back: " + error)
+
+                rewrite_path = path + ".rewrite"
+                rewrite_file(rewrite_path, kind, item)
+                with open(rewrite_path, 'rb') as file:
+                    if file.read() != data:
+                        errors.append("writing what was read back changes the file")
+            except Exception as e:
+                errors = ["%s: %s" % (type(e).__name__, e)]
+
+            for error in errors:
+                failures.append((key, error))
+            if verbose:
+                print(" %-20s %s" % (key, "ok" if len(errors) == 0 else "FAILED, " + "; ".join(errors)))
+    return failures, outputs
+
+
+def print_golden(outputs):
+    print("GOLDEN_SMALL = {")
+    for key, data in outputs.items():
+        if key.startswith("small."):
+            text = data.hex()
+            lines = ['"%s"' % text[start:start + 64] for start in range(0, len(text), 64)]
+            print('    "%s": (%s),' % (key, "\n        ".join(lines)))
+    print("}")
+    print("")
+    print("GOLDEN_SHA256 = {")
+    for key, data in outputs.items():
+        print('    "%s": "%s",' % (key, hashlib.sha256(data).hexdigest()))
+    print("}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check the BND/BBND/TER writers and readers against golden output.")
+    parser.add_argument("--print-golden", action="store_true", help="print the current output as golden data instead of checking it")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as directory:
+        failures, outputs = run(directory, verbose=not args.print_golden)
+
+    if args.print_golden:
+        print_golden(outputs)
+        return 0
+
+    print("%d files checked, %d failed." % (len(outputs), len(set(key for key, error in failures))))
+    return 1 if len(failures) > 0 else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
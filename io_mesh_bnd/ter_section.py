@@ -7,10 +7,298 @@
 #
 # ##### END LICENSE BLOCK #####
 
-class TerSection:
-    def __init__(self, bounds_min, bounds_max, edges, polygon):
-        self.edges = edges
-        self.bounds = (bounds_min, bounds_max)
-        self.polygon = polygon
-        self.group = []
-        
+import numpy as np
+
+import io_mesh_bnd.instrumentation as instrumentation
+
+BOUNDS_INFLATION = 0.1
+
+
+######################################################
+# INTERSECTION KERNEL
+######################################################
+def intersect_pairs(loop_co, edge_co, face_starts, face_sizes, pair_faces, rect_min, rect_max):
+    """Batched face/section intersection test.
+
+    loop_co is (loops, 2) with the 2D position of every face corner, edge_co
+    is (loops, 4) with the 2D endpoints of the edge each loop starts. Face i
+    owns loops face_starts[i] .. face_starts[i] + face_sizes[i]. Each pair k
+    tests face pair_faces[k] against the rectangle rect_min[k]..rect_max[k].
+    Returns a boolean mask over the pairs."""
+    num_pairs = len(pair_faces)
+    hit = np.zeros(num_pairs, dtype=bool)
+    if num_pairs == 0:
+      return hit
+
+    starts = face_starts[pair_faces]
+    sizes = face_sizes[pair_faces]
+
+    min_x = rect_min[:, 0]
+    min_y = rect_min[:, 1]
+    max_x = rect_max[:, 0]
+    max_y = rect_max[:, 1]
+
+    # section corners, counter clockwise from min
+    corner_x = np.stack((min_x, max_x, max_x, min_x), axis=1)
+    corner_y = np.stack((min_y, min_y, max_y, max_y), axis=1)
+    corner_inside = np.zeros((num_pairs, 4), dtype=bool)
+
+    # section edges, bottom, right, top, left
+    section_edges = ((min_x, min_y, max_x, min_y), (max_x, min_y, max_x, max_y),
+                     (min_x, max_y, max_x, max_y), (min_x, min_y, min_x, max_y))
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+      for k in range(int(sizes.max())):
+        valid = k < sizes
+        p1 = loop_co[starts + np.where(valid, k, 0)]
+        p2 = loop_co[starts + np.where(k + 1 < sizes, k + 1, 0)]
+
+        # check if this polygon surrounds the section corners (ray cast)
+        p1x = p1[:, 0, None]
+        p1y = p1[:, 1, None]
+        p2x = p2[:, 0, None]
+        p2y = p2[:, 1, None]
+        xinters = (corner_y - p1y) * (p2x - p1x) / (p2y - p1y) + p1x
+        crosses = ((corner_y > np.minimum(p1y, p2y)) & (corner_y <= np.maximum(p1y, p2y)) &
+                   (corner_x <= np.maximum(p1x, p2x)) & ((p1x == p2x) | (corner_x <= xinters)))
+        corner_inside ^= crosses & valid[:, None]
+
+        # edge endpoints inside the section
+        edge = edge_co[starts + np.where(valid, k, 0)]
+        p = edge[:, 0]
+        q = edge[:, 1]
+        r = edge[:, 2]
+        s = edge[:, 3]
+        edge_hit = ((p >= min_x) & (q >= min_y) & (p <= max_x) & (q <= max_y)) | \
+                   ((r >= min_x) & (s >= min_y) & (r <= max_x) & (s <= max_y))
+
+        # edge-edge intersection (only if edge is not vertical)
+        edge_is_vertical = (p == r) & (q == s)
+        for a, b, c, d in section_edges:
+          det = (c - a) * (s - q) - (r - p) * (d - b)
+          lmbda = ((s - q) * (r - a) + (p - r) * (s - b)) / det
+          gamma = ((b - d) * (r - a) + (c - a) * (s - b)) / det
+          edge_hit |= ~edge_is_vertical & (np.abs(det) >= 0.001) & (0 < lmbda) & (lmbda < 1) & (0 < gamma) & (gamma < 1)
+
+        hit |= valid & edge_hit
+
+    return hit | corner_inside.any(axis=1)
+
+
+def mix_hash(values):
+    # splitmix64 finalizer, wraps on overflow
+    values = (values ^ (values >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    values = (values ^ (values >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return values ^ (values >> np.uint64(31))
+
+
+def hash_faces(loop_co, edge_co, face_starts, face_sizes):
+    """64 bit hash of everything the section test reads for each face, its
+    loop positions and edge endpoints, in loop order. Same layout as
+    intersect_pairs."""
+    face_sizes = np.asarray(face_sizes, dtype=np.int64)
+    if len(face_sizes) == 0:
+      return np.zeros(0, dtype=np.uint64)
+
+    # loops of every face, in face order
+    offsets = np.cumsum(face_sizes) - face_sizes
+    loop_offsets = np.arange(int(face_sizes.sum())) - np.repeat(offsets, face_sizes)
+    loops = np.repeat(np.asarray(face_starts, dtype=np.int64), face_sizes) + loop_offsets
+
+    coords = np.concatenate((np.asarray(loop_co, dtype=np.float64).reshape(-1, 2)[loops],
+                             np.asarray(edge_co, dtype=np.float64).reshape(-1, 4)[loops]), axis=1)
+    words = np.ascontiguousarray(coords).view(np.uint64)
+
+    with np.errstate(over='ignore'):
+      loop_hash = loop_offsets.astype(np.uint64)
+      for column in range(words.shape[1]):
+        loop_hash = mix_hash(loop_hash ^ words[:, column])
+      face_hash = np.add.reduceat(loop_hash, offsets)
+      return mix_hash(face_hash ^ face_sizes.astype(np.uint64))
+
+
+######################################################
+# SECTION GRID
+######################################################
+class TerGrid:
+    """Regular width x depth grid of TER sections, stored in file order
+    (depth major, width reversed). Faces are binned by their 2D bounds so
+    each one is only tested against the cells it can overlap.
+
+    Section rectangles are worked out from the origin and cell size when
+    needed. After assign() the faces of section i are
+    section_faces[section_offsets[i]:section_offsets[i + 1]]."""
+
+    # upper bound on face/section pairs tested in one batch
+    PAIR_BATCH_SIZE = 1 << 18
+
+    def __init__(self, bnds_min, width_sections, depth_sections, section_width, section_depth):
+        self.bnds_min = bnds_min
+        self.width_sections = width_sections
+        self.depth_sections = depth_sections
+        self.section_width = section_width
+        self.section_depth = section_depth
+
+        # every section empty until assign()
+        self.section_offsets = np.zeros(self.num_sections + 1, dtype=np.int64)
+        self.section_faces = np.zeros(0, dtype=np.int64)
+
+    @property
+    def num_sections(self):
+        return self.width_sections * self.depth_sections
+
+    @property
+    def section_sizes(self):
+        return np.diff(self.section_offsets)
+
+    def section_index(self, w, d):
+        return (d * self.width_sections) + (self.width_sections - 1 - w)
+
+    def section_group(self, section):
+        return self.section_faces[self.section_offsets[section]:self.section_offsets[section + 1]]
+
+    def section_bounds(self, sections):
+        """Inflated (min, max) 2D rectangles of an array of section indices"""
+        sections = np.asarray(sections, dtype=np.int64)
+        d = sections // self.width_sections
+        w = (self.width_sections - 1) - (sections % self.width_sections)
+        section_min = np.empty((len(sections), 2), dtype=np.float64)
+        section_max = np.empty((len(sections), 2), dtype=np.float64)
+        section_min[:, 0] = (self.bnds_min[0] + (w * self.section_width)) - BOUNDS_INFLATION
+        section_min[:, 1] = (self.bnds_min[1] + (d * self.section_depth)) - BOUNDS_INFLATION
+        section_max[:, 0] = (self.bnds_min[0] + ((w + 1) * self.section_width)) + BOUNDS_INFLATION
+        section_max[:, 1] = (self.bnds_min[1] + ((d + 1) * self.section_depth)) + BOUNDS_INFLATION
+        return section_min, section_max
+
+    def _cell_range(self, lo, hi, origin, size, count, margin):
+        if size <= 0:
+          return np.zeros(len(lo), dtype=np.int64), np.full(len(hi), count - 1, dtype=np.int64)
+
+        first = np.floor((lo - BOUNDS_INFLATION - origin) / size).astype(np.int64) - margin
+        last = np.floor((hi + BOUNDS_INFLATION - origin) / size).astype(np.int64) + margin
+        return np.maximum(first, 0), np.minimum(last, count - 1)
+
+    def cell_range(self, face_min, face_max, margin=1):
+        # widened by a cell on either side by default, the exact bounds test
+        # still runs on every candidate so this only guards against rounding
+        w_first, w_last = self._cell_range(face_min[:, 0], face_max[:, 0], self.bnds_min[0], self.section_width, self.width_sections, margin)
+        d_first, d_last = self._cell_range(face_min[:, 1], face_max[:, 1], self.bnds_min[1], self.section_depth, self.depth_sections, margin)
+        return w_first, w_last, d_first, d_last
+
+    def overlap_sizes(self, face_min, face_max):
+        """Faces per section counting every face whose 2D bounds overlap it,
+        an upper bound on what assign() finds that is cheap enough to try
+        several grids with. In file order."""
+        width = self.width_sections
+        depth = self.depth_sections
+        w_first, w_last, d_first, d_last = self.cell_range(face_min, face_max, margin=0)
+
+        # +1/-1 at the corners of each face's cell rectangle, summed up
+        # along both axes
+        corners = width + 1
+        size = (depth + 1) * corners
+        diff = (np.bincount((d_first * corners) + w_first, minlength=size) -
+                np.bincount((d_first * corners) + w_last + 1, minlength=size) -
+                np.bincount(((d_last + 1) * corners) + w_first, minlength=size) +
+                np.bincount(((d_last + 1) * corners) + w_last + 1, minlength=size))
+        counts = diff.reshape(depth + 1, corners).cumsum(axis=0).cumsum(axis=1)[:depth, :width]
+        return counts[:, ::-1].ravel()
+
+    @staticmethod
+    def face_bounds(loop_co, face_starts, face_sizes):
+        face_min = np.full((len(face_starts), 2), 9999, dtype=np.float64)
+        face_max = np.full((len(face_starts), 2), -9999, dtype=np.float64)
+        for k in range(int(face_sizes.max()) if len(face_sizes) > 0 else 0):
+          pt = loop_co[face_starts + np.minimum(k, face_sizes - 1)]
+          np.minimum(face_min, pt, out=face_min)
+          np.maximum(face_max, pt, out=face_max)
+        return face_min, face_max
+
+    def hit_pairs(self, loop_co, edge_co, face_starts, face_sizes, face_min, face_max, faces, w_first, w_last, d_first, d_last, progress=None):
+        """Test faces[i] against the cells w_first[i]..w_last[i] x
+        d_first[i]..d_last[i]. Returns the (section, face) of every hit,
+        in face order. progress is called with the fraction of faces done
+        after every batch."""
+        w_count = np.maximum(w_last - w_first + 1, 0)
+        pair_counts = w_count * np.maximum(d_last - d_first + 1, 0)
+        pair_ends = np.cumsum(pair_counts)
+
+        hit_sections = [np.zeros(0, dtype=np.int64)]
+        hit_faces = [np.zeros(0, dtype=np.int64)]
+
+        # batch faces so the candidate pairs stay within PAIR_BATCH_SIZE
+        first_face = 0
+        num_faces = len(faces)
+        while first_face < num_faces:
+          batch_base = pair_ends[first_face - 1] if first_face > 0 else 0
+          last_face = int(np.searchsorted(pair_ends, batch_base + self.PAIR_BATCH_SIZE, side='right'))
+          last_face = min(max(last_face, first_face + 1), num_faces)
+
+          candidates = np.arange(first_face, last_face)
+          counts = pair_counts[first_face:last_face]
+          pair_candidates = np.repeat(candidates, counts)
+          pair_offset = np.arange(len(pair_candidates)) - np.repeat(pair_ends[first_face:last_face] - counts - batch_base, counts)
+          pair_w_count = w_count[pair_candidates]
+          pair_w = w_first[pair_candidates] + (pair_offset % np.maximum(pair_w_count, 1))
+          pair_d = d_first[pair_candidates] + (pair_offset // np.maximum(pair_w_count, 1))
+          pair_faces = faces[pair_candidates]
+          pair_sections = (pair_d * self.width_sections) + (self.width_sections - 1 - pair_w)
+
+          # bounds check
+          rect_min, rect_max = self.section_bounds(pair_sections)
+          fmin = face_min[pair_faces]
+          fmax = face_max[pair_faces]
+          overlap = ((fmin[:, 0] <= rect_max[:, 0]) & (fmax[:, 0] >= rect_min[:, 0]) &
+                     (fmin[:, 1] <= rect_max[:, 1]) & (fmax[:, 1] >= rect_min[:, 1]))
+
+          pair_faces = pair_faces[overlap]
+          pair_sections = pair_sections[overlap]
+          hit = intersect_pairs(loop_co, edge_co, face_starts, face_sizes, pair_faces, rect_min[overlap], rect_max[overlap])
+          instrumentation.current().count("intersection_tests", len(pair_faces))
+
+          hit_sections.append(pair_sections[hit])
+          hit_faces.append(pair_faces[hit])
+          first_face = last_face
+          if progress is not None:
+            progress(first_face / num_faces)
+
+        return np.concatenate(hit_sections), np.concatenate(hit_faces)
+
+    def face_hits(self, loop_co, edge_co, face_starts, face_sizes, faces, progress=None):
+        """(section, face) of every hit of the given faces, in face order"""
+        starts = face_starts[faces]
+        sizes = face_sizes[faces]
+        face_min, face_max = self.face_bounds(loop_co, starts, sizes)
+        w_first, w_last, d_first, d_last = self.cell_range(face_min, face_max)
+        hit_sections, hit_ids = self.hit_pairs(loop_co, edge_co, starts, sizes, face_min, face_max,
+                                               np.arange(len(faces)), w_first, w_last, d_first, d_last, progress)
+        return hit_sections, faces[hit_ids]
+
+    def set_groups(self, hit_sections, hit_faces):
+        """Store (section, face) hits as the section groups. Hits of one
+        section must come in ascending face order."""
+        # a stable sort keeps each group ascending
+        order = np.argsort(hit_sections, kind='stable')
+        self.section_faces = hit_faces[order].astype(np.int64, copy=False)
+        self.section_offsets = np.zeros(self.num_sections + 1, dtype=np.int64)
+        np.cumsum(np.bincount(hit_sections, minlength=self.num_sections), out=self.section_offsets[1:])
+
+    def assign(self, loop_co, edge_co, face_starts, face_sizes, progress=None):
+        """Find the faces touching each section, see intersect_pairs for the
+        array layout. progress is called with the fraction done now and
+        then. Returns the total number of poly indices."""
+        loop_co = np.ascontiguousarray(loop_co, dtype=np.float64).reshape(-1, 2)
+        edge_co = np.ascontiguousarray(edge_co, dtype=np.float64).reshape(-1, 4)
+        face_starts = np.ascontiguousarray(face_starts, dtype=np.int64)
+        face_sizes = np.ascontiguousarray(face_sizes, dtype=np.int64)
+
+        if len(face_starts) == 0:
+          self.set_groups(np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64))
+          return 0
+
+        hit_sections, hit_faces = self.face_hits(loop_co, edge_co, face_starts, face_sizes, np.arange(len(face_starts)), progress)
+
+        # pairs were produced in face order
+        self.set_groups(hit_sections, hit_faces)
+        return len(self.section_faces)
+